@@ -1,18 +1,97 @@
-from helpers import  create_clean_dataframe, init_figure, getTotals
-from layout import load_display_data
-from scrap import get_scraped_data
-import dash
+import time
+
+# Taken before the heavy imports, the startup time covers them too
+LAUNCHED_AT = time.perf_counter()
+
+import logging
+import os
+import sys
+import threading
+
+# Only the scraping side is imported here, dash and the layout are imported when the app serves (not by the publisher)
+from refresher import DataRefresher, crawl_histories_in_process
+from shared_snapshot import SHARED_SNAPSHOT_DIR
+
+# Seconds between two background scrapes
+REFRESH_INTERVAL = int(os.environ.get("REFRESH_INTERVAL", 60 * 60))
+# Where the last-good snapshot is saved, the app starts from it instead of waiting for a crawl
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+# Set CRAWL_COUNTRY_HISTORIES=0 not to crawl the page of every country after the refreshes (daily histories)
+CRAWL_COUNTRY_HISTORIES = os.environ.get("CRAWL_COUNTRY_HISTORIES", "1") == "1"
+# Debug only: log the cProfile output of the N slowest callback calls (0 disables the profiler)
+PROFILE_SLOWEST_CALLBACKS = int(os.environ.get("PROFILE_SLOWEST_CALLBACKS", 0))
+# The SQLite database keeping every scraped row (HISTORY_PATH) is set in corona_stats/settings.py
+
+logger = logging.getLogger(__name__)
+
+
+def log_first_request(server, started_from):
+    """
+    This function logs how long the process took from launch until its first request was served.
+
+    Parameters:
+        server : Flask
+            The flask server of the dash app.
+        started_from : str
+            Where the first snapshot came from ("disk snapshot" or "live crawl"), added to the log line.
+    """
+    served = []
+
+    @server.after_request
+    def _log_first_request(response):
+        if not served:
+            served.append(True)
+            logger.info("Startup: first request served %.2fs after launch (%s)",
+                        time.perf_counter() - LAUNCHED_AT, started_from)
+        return response
+
+
+def start_refresher(publish_dir=None):
+    """
+    This function gets the first snapshot, from disk or from a live crawl, and starts the background refreshes.
+
+    Parameters:
+        publish_dir : str, Default=None
+            Where to publish every snapshot for the serving workers (see shared_snapshot.publish_snapshot).
+    Returns:
+        refresher : DataRefresher
+            The running refresher.
+        started_from : str
+            Where the first snapshot came from ("disk snapshot" or "live crawl").
+    """
+    refresher = DataRefresher(interval=REFRESH_INTERVAL, snapshot_dir=SNAPSHOT_DIR, publish_dir=publish_dir,
+                              crawl_histories=crawl_histories_in_process if CRAWL_COUNTRY_HISTORIES else None)
+    if refresher.load() is not None:
+        # Serve the snapshot from disk right away and revalidate it in the background
+        started_from = "disk snapshot"
+        refresher.start(refresh_now=True)
+    else:
+        started_from = "live crawl"
+        if refresher.refresh() is None:
+            raise SystemExit("The first scrape failed and there is no saved snapshot, there is no data to serve.")
+        refresher.start()
+    logger.info("Startup: data ready %.2fs after launch (%s)", time.perf_counter() - LAUNCHED_AT, started_from)
+    return refresher, started_from
+
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    if sys.argv[1:] == ["publish"]:
+        # Production: only crawl and publish the snapshots, the gunicorn workers serve them (see gunicorn.conf.py)
+        start_refresher(publish_dir=SHARED_SNAPSHOT_DIR)
+        threading.Event().wait()
+
+    from instrumentation import CallbackMetrics
+    from layout import load_display_data
 
-    total_stats, countries_data = get_scraped_data()
-    data = create_clean_dataframe(countries_data)
+    refresher, started_from = start_refresher()
 
-    fig, init_continent_fig, init_k_countries_plot, init_box_fig, init_dount_fig, gh = init_figure(data)
-    total_cases, total_deaths, total_recoveries = total_stats["TotalCase"], total_stats["TotalDeaths"], total_stats["TotalRecovered"] 
+    # The callback metrics are served on /metrics
+    app = load_display_data(refresher, metrics=CallbackMetrics(profile_slowest=PROFILE_SLOWEST_CALLBACKS))
 
-    app = load_display_data(data, total_cases, total_deaths, total_recoveries, fig, init_continent_fig, init_k_countries_plot, init_box_fig, init_dount_fig, gh)
-    
     # app = dash.Dash(__name__)
     server = app.server
-    app.run_server(debug=True, port=8096)
+    log_first_request(server, started_from)
+    # The reloader would run the whole startup (snapshot load, first crawl) twice
+    app.run_server(debug=True, port=8096, use_reloader=False)
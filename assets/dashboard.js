@@ -0,0 +1,52 @@
+// The clientside callbacks of layout.py: the same figures as helpers.plot_continent_data and helpers.plot_dount,
+// drawn in the browser from the client_data store (see helpers.client_data) instead of requested from the server,
+// with the plotly template of assets/plotly_template.js.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    dashboard: {
+        continent_bar: function(keyword, blob) {
+            if (!blob) {
+                return window.dash_clientside.no_update;
+            }
+            const columns = blob.keyword_columns[keyword === "New" ? "New" : "Total"];
+            return {
+                data: columns.map(function(column, i) {
+                    return {
+                        type: "bar",
+                        x: blob.continents,
+                        y: blob.continent_sums[column],
+                        name: column,
+                        marker: {color: blob.bar_colors[i]}
+                    };
+                }),
+                layout: {
+                    template: window.dashboardTemplate,
+                    title: {text: "Corona " + keyword + " Cases/Recovered/Deaths"},
+                    xaxis: {title: {text: "Continents"}},
+                    yaxis: {title: {text: "Cases per Continent"}}
+                }
+            };
+        },
+
+        donut: function(country, blob) {
+            if (!blob) {
+                return window.dash_clientside.no_update;
+            }
+            // A missing country falls back to the first one, like plot_dount
+            if (!(country in blob.donut)) {
+                country = Object.keys(blob.donut)[0];
+            }
+            return {
+                data: [{
+                    type: "pie",
+                    labels: ["Active Cases", "Recovered", "Deaths"],
+                    values: blob.donut[country] || [0, 0, 0],
+                    hole: 0.3
+                }],
+                layout: {
+                    template: window.dashboardTemplate,
+                    title: {text: "COVID-19 Distribution for " + country}
+                }
+            };
+        }
+    }
+});
@@ -0,0 +1,88 @@
+"""
+Counts the requests the dashboard server answers during a scripted browsing session, with the New/Total toggle
+and the donut drawn in the browser (clientside callbacks, as served now) and with every callback on the server (before).
+
+The Dash renderer sends one /_dash-update-component request per server callback whose input changed,
+and one per server callback when the page loads (initial call). The session replays these requests through
+the Flask test client. The requests of the clientside callbacks are counted as they were before:
+one request per change, answered with the figure plot_continent_data/plot_dount builds.
+
+    python benchmarks/bench_clientside.py
+"""
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plotly.io.json import to_json_plotly
+
+from dash_requests import dependency_inputs, fixture_snapshot, post_callback
+from helpers import plot_continent_data, plot_dount
+from layout import load_display_data
+
+# The values of the dropdowns (and the version of the snapshot), as the page loads
+INITIAL_VALUES = {"select_keyword": "New", "select_attribute": "TotalCases", "select_k_countries": 10,
+                  "select_box_attribute": "Deaths/1M pop", "country-dropdown": "USA", "snapshot_version": 1}
+
+# The changes of the session, after the page load: (dropdown, new value)
+SESSION = (
+    [("select_keyword", keyword) for keyword in ["Total", "New", "Total", "New"]]
+    + [("country-dropdown", country) for country in ["France", "India", "Brazil", "Germany", "Japan", "Italy",
+                                                       "Spain", "Morocco", "Canada", "Mexico", "UK", "USA"]]
+    + [("select_attribute", attribute) for attribute in ["NewCases", "TotalDeaths", "Deaths/1M pop"]]
+    + [("select_k_countries", k) for k in [25, 50]]
+    + [("select_box_attribute", attribute) for attribute in ["Tests/1Mpop", "Deaths/1M pop"]]
+)
+
+# What the removed server callbacks drew, to size their responses
+SERVER_FIGURES = {
+    "continent_corona_bar.figure": lambda dataset, values: plot_continent_data(dataset, values["select_keyword"]),
+    "covid_donut_graph.figure": lambda dataset, values: plot_dount(dataset, values["country-dropdown"]),
+}
+
+
+def old_response_size(dataset, callback, values):
+    figure = SERVER_FIGURES[callback["output"]](dataset, values).to_dict()
+    component, prop = callback["output"].split(".")
+    return len(to_json_plotly({"multi": True, "response": {component: {prop: figure}}}))
+
+
+def main():
+    snapshot = fixture_snapshot()
+    client = load_display_data(SimpleNamespace(current=snapshot)).server.test_client()
+
+    callbacks = client.get("/_dash-dependencies").get_json()
+    layout_bytes = len(client.get("/_dash-layout").data)
+    blob_bytes = len(json.dumps(snapshot.client_data))
+
+    # (requests, response bytes) of the callbacks, with the clientside callbacks and before
+    counts = {"clientside": [0, 0], "server only": [0, 0]}
+    values = dict(INITIAL_VALUES)
+    changes = [None] + SESSION
+    for change in changes:
+        if change is not None:
+            values[change[0]] = change[1]
+        for callback in callbacks:
+            if change is not None and change[0] not in [item["id"] for item in callback["inputs"]]:
+                continue
+            if callback.get("clientside_function"):
+                counts["server only"][0] += 1
+                counts["server only"][1] += old_response_size(snapshot.dataset, callback, values)
+            else:
+                response = post_callback(client, callback["output"], dependency_inputs(callback, values), changed=False)
+                size = len(response.data)
+                for mode in counts:
+                    counts[mode][0] += 1
+                    counts[mode][1] += size
+
+    print(f"Session: page load + {len(SESSION)} dropdown changes, "
+          f"{sum(bool(callback.get('clientside_function')) for callback in callbacks)} of {len(callbacks)} callbacks clientside")
+    print(f"{'callbacks':<14}{'server requests':>17}{'response bytes':>16}{'layout bytes':>14}")
+    print(f"{'server only':<14}{counts['server only'][0]:>17}{counts['server only'][1]:>16}{layout_bytes - blob_bytes:>14}")
+    print(f"{'clientside':<14}{counts['clientside'][0]:>17}{counts['clientside'][1]:>16}{layout_bytes:>14}")
+
+
+if __name__ == "__main__":
+    main()
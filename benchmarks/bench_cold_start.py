@@ -0,0 +1,77 @@
+"""
+Measures how long `python app.py` takes from launch until it serves its first request,
+without a saved snapshot (live crawl) and with one (cold start from disk).
+
+The crawl targets a local HTTP stand-in serving the saved fixture, so the numbers do not depend on worldometers.
+
+    python benchmarks/bench_cold_start.py
+"""
+import functools
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from fixture_page import FIXTURE_DIR
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_URL = "http://127.0.0.1:8096/"
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    """Serves the saved fixture page for any path."""
+
+    def translate_path(self, path):
+        return os.path.join(FIXTURE_DIR, "worldometers.html")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_fixture():
+    """This function starts the local stand-in and returns its url."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(FixtureHandler, directory=FIXTURE_DIR))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}/coronavirus"
+
+
+def time_to_first_request(env, timeout=180):
+    """This function launches the app and returns the seconds until it answers its first request."""
+    launched = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "app.py"], cwd=ROOT, env=env, start_new_session=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - launched < timeout:
+            try:
+                with urllib.request.urlopen(APP_URL, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - launched
+            except OSError:
+                time.sleep(0.05)
+        raise TimeoutError("The app did not answer in time")
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait()
+
+
+def main():
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        env = dict(os.environ, WORLDOMETERS_URL=serve_fixture(), SNAPSHOT_DIR=snapshot_dir,
+                   REFRESH_INTERVAL=str(24 * 60 * 60))
+        # The first launch has no snapshot and saves one, the second one starts from it
+        without_snapshot = time_to_first_request(env)
+        with_snapshot = time_to_first_request(env)
+
+    print(f"{'startup':<22}{'first request (s)':>20}")
+    print(f"{'live crawl':<22}{without_snapshot:>20.2f}")
+    print(f"{'disk snapshot':<22}{with_snapshot:>20.2f}")
+
+
+if __name__ == "__main__":
+    main()
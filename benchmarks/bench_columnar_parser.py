@@ -0,0 +1,78 @@
+"""
+Microbenchmark of the countries table parsers: the original row by row parser (row_parser.py + create_clean_dataframe)
+against the columnar one (parser_mode="columnar") and the typed items (parser_mode="items", one CoronaStatsItem
+per country), on the saved fixture and on a 10x synthetic page.
+
+    python benchmarks/bench_columnar_parser.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from scrapy.http import HtmlResponse
+
+from corona_stats.spiders.coronaspider import CoronaSpiderSpider
+from fixture_page import build_page, load_fixture
+from helpers import create_clean_dataframe
+from row_parser import parse_rows as parse_table_rows
+from scrap import countries_frame
+
+
+URL = "https://www.worldometers.info/coronavirus"
+
+
+def parse_rows(body):
+    """This function runs the row by row parser and builds the dataframe out of the dict of dicts."""
+    response = HtmlResponse(url=URL, body=body, encoding="utf-8")
+    return create_clean_dataframe(parse_table_rows(response))
+
+
+def parse_columnar(body):
+    """This function runs the columnar parser, which builds the typed dataframe directly."""
+    response = HtmlResponse(url=URL, body=body, encoding="utf-8")
+    item = next(CoronaSpiderSpider(parser_mode="columnar").parse(response))
+    return create_clean_dataframe(item["countries_frame"])
+
+
+def parse_items(body):
+    """This function runs the typed items parser and builds the dataframe out of the items."""
+    response = HtmlResponse(url=URL, body=body, encoding="utf-8")
+    items = list(CoronaSpiderSpider(parser_mode="items").parse(response))
+    return create_clean_dataframe(countries_frame(items))
+
+
+def best_time(func, body, repeat):
+    """This function returns the best wall time of func(body) over repeat runs, with its last result."""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(body)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    pages = [("fixture", load_fixture(), 10), ("10x synthetic", build_page(2300).encode("utf-8"), 3)]
+
+    print(f"{'page':<16}{'parser':<10}{'rows':>8}{'time (ms)':>12}{'rows/s':>12}")
+    for label, body, repeat in pages:
+        rows_time, rows_data = best_time(parse_rows, body, repeat)
+        col_time, col_data = best_time(parse_columnar, body, repeat)
+        items_time, items_data = best_time(parse_items, body, repeat)
+        pd.testing.assert_frame_equal(col_data, items_data)
+
+        # Both parsers must agree on every numeric value the dashboard uses
+        numeric = ["TotalCases", "TotalDeaths", "TotalRecovered", "Population"]
+        pd.testing.assert_frame_equal(rows_data[numeric].astype(float), col_data[numeric].astype(float),
+                                      check_names=False)
+
+        for parser, elapsed in (("rows", rows_time), ("columnar", col_time), ("items", items_time)):
+            print(f"{label:<16}{parser:<10}{len(col_data):>8}{elapsed * 1e3:>12.2f}{len(col_data) / elapsed:>12,.0f}")
+        print(f"{label:<16}speedup: {rows_time / col_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Compares a full download of the page with a conditional one answered 304 Not Modified by a local stand-in,
+and with a page downloaded again but short-circuited on its content hash, in bytes received and in scrape time
+(each scrape runs in its own process, like the refresher does).
+
+    python benchmarks/bench_conditional_fetch.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fixture_server import FixtureServer
+
+
+def timed_scrape(skip_unchanged, last_content_hash=None):
+    """This function runs one scrape in a child process and returns (seconds, result)."""
+    from refresher import scrape_in_subprocess
+
+    start = time.perf_counter()
+    result = scrape_in_subprocess(skip_unchanged=skip_unchanged, last_content_hash=last_content_hash)
+    return time.perf_counter() - start, result
+
+
+def report(name, status, body_bytes, seconds, total_stats):
+    parse_cpu = f"{total_stats['parse_cpu']:.3f}" if "parse_cpu" in total_stats else "skipped"
+    print(f"{name:<40}{status:>8}{body_bytes:>12}{seconds:>10.2f}{parse_cpu:>15}")
+
+
+def main():
+    server = FixtureServer().start()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        os.environ.update(WORLDOMETERS_URL=server.url, CONDITIONAL_FETCH_DIR=cache_dir)
+
+        print(f"{'scrape':<40}{'status':>8}{'body bytes':>12}{'time (s)':>10}{'parse CPU (s)':>15}")
+        cases = [
+            ("first scrape (empty cache)", False, 200),
+            ("unchanged page, skip_unchanged", True, 304),
+            ("unchanged page, parsed from cache", False, 304),
+        ]
+        last_content_hash = None
+        for name, skip_unchanged, status in cases:
+            sent = server.bytes_sent[status]
+            seconds, (total_stats, countries_data) = timed_scrape(skip_unchanged, last_content_hash)
+            if skip_unchanged:
+                assert countries_data is None, "the unchanged page was parsed"
+            else:
+                assert len(countries_data) > 0
+                last_content_hash = total_stats["content_hash"]
+            report(name, status, server.bytes_sent[status] - sent, seconds, total_stats)
+
+        # Only the markup around the data changes: the page is downloaded again but its content hash matches
+        server.set_body(server.body.replace(b"</body>", b"<!-- ad rotation --></body>"))
+        sent = server.bytes_sent[200]
+        seconds, (total_stats, countries_data) = timed_scrape(True, last_content_hash)
+        assert total_stats["unchanged"] == "same_content", "the page was parsed although its data did not change"
+        report("same data, new markup, skip_unchanged", 200, server.bytes_sent[200] - sent, seconds, total_stats)
+
+        # The data changes: the validators and the content hash no longer match, the page is parsed
+        server.set_body(server.body.replace(b"Testland", b"Newland"))
+        sent = server.bytes_sent[200]
+        seconds, (total_stats, countries_data) = timed_scrape(True, last_content_hash)
+        assert countries_data is not None
+        report("changed data, skip_unchanged", 200, server.bytes_sent[200] - sent, seconds, total_stats)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Compares the continent level callbacks computing a groupby on every call (the previous implementation)
+with the ones reading the aggregates precomputed by CoronaDataset, at the real size and at 10x/100x rows.
+
+    python benchmarks/bench_continent_aggregates.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+import plotly.graph_objs as go
+from scrapy.http import HtmlResponse
+
+from corona_stats.spiders.coronaspider import CoronaSpiderSpider
+from dataset import CoronaDataset
+from fixture_page import load_fixture
+from helpers import create_clean_dataframe, plot_boxplots, plot_continent_data
+
+
+URL = "https://www.worldometers.info/coronavirus"
+
+
+def groupby_continent_data(data, keyword):
+    """The previous plot_continent_data: one groupby per call."""
+    cols = ["NewCases", "NewRecovered", "NewDeaths"] if keyword == "New" else ["TotalCases", "TotalRecovered", "TotalDeaths"]
+    res = data.groupby("Continent", observed=True)[cols].sum()
+    colors = ["#101e70", "#186e3c", "#cc1b35"]
+    plot_data = [go.Bar(x=res.index.to_list(), y=res[col], name=col, marker=dict(color=color)) for col, color in zip(cols, colors)]
+    return go.Figure(data=plot_data, layout=go.Layout(title=f"Corona {keyword} Cases/Recovered/Deaths"))
+
+
+def groupby_boxplots(data, keyword):
+    """The previous plot_boxplots: one groupby, a value_counts and a get_group per continent on every call."""
+    grouped_data = data.groupby("Continent", observed=True)
+    continents = data["Continent"].value_counts().loc[lambda counts: counts > 0].index.to_list()
+    plot_data = [go.Box(y=grouped_data.get_group(continent)[keyword], name=continent) for continent in continents]
+    return go.Figure(data=plot_data, layout=go.Layout(title=f"Boxplots using {keyword}"))
+
+
+def scale(data, factor):
+    """This function repeats the dataset factor times, with unique country names."""
+    if factor == 1:
+        return data
+    scaled = pd.concat([data] * factor)
+    scaled.index = [f"{country} {i // len(data)}" for i, country in enumerate(scaled.index)]
+    return scaled
+
+
+def mean_time(func, repeat=30):
+    """This function returns the mean wall time of func, after a warm-up call."""
+    func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    response = HtmlResponse(url=URL, body=load_fixture(), encoding="utf-8")
+    base = create_clean_dataframe(next(CoronaSpiderSpider(parser_mode="columnar").parse(response))["countries_frame"])
+
+    print(f"{'rows':>8}  {'callback':<22}{'groupby (ms)':>14}{'precomputed (ms)':>18}")
+    for factor in (1, 10, 100):
+        data = scale(base, factor)
+        dataset = CoronaDataset(data)
+        cases = [
+            ("continent bar (New)", lambda: groupby_continent_data(data, "New"), lambda: plot_continent_data(dataset, "New")),
+            ("continent bar (Total)", lambda: groupby_continent_data(data, "Total"), lambda: plot_continent_data(dataset, "Total")),
+            ("boxplots", lambda: groupby_boxplots(data, "Deaths/1M pop"), lambda: plot_boxplots(dataset, "Deaths/1M pop")),
+        ]
+        for name, old, new in cases:
+            print(f"{len(data):>8}  {name:<22}{mean_time(old) * 1e3:>14.2f}{mean_time(new) * 1e3:>18.2f}")
+        print(f"{len(data):>8}  {'dataset build (once)':<22}{'':>14}{mean_time(lambda: CoronaDataset(data), 5) * 1e3:>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
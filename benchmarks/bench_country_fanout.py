@@ -0,0 +1,58 @@
+"""
+Measures the fan-out crawl of the country pages (CountryHistorySpider) against a local stand-in answering
+every country page after a simulated latency, for a few concurrency settings.
+The stand-in runs in a child process, so it does not slow the crawl down.
+
+The throughput and the latencies come from the country_pages/ stats of the crawl. The items go through the pipeline
+as in production, the daily histories are written to a temporary database.
+
+    python benchmarks/bench_country_fanout.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fixture_server import start_in_subprocess
+
+
+# Seconds the stand-in waits before answering a country page
+LATENCY = 0.05
+
+# (name, settings overriding CountryHistorySpider.custom_settings)
+CONFIGS = [
+    ("1 per domain (sequential)", {"CONCURRENT_REQUESTS_PER_DOMAIN": 1, "AUTOTHROTTLE_ENABLED": False}),
+    ("8 per domain, no throttling", {"AUTOTHROTTLE_ENABLED": False}),
+    ("8 per domain + AutoThrottle", {}),
+    ("16 per domain + AutoThrottle", {"CONCURRENT_REQUESTS_PER_DOMAIN": 16, "AUTOTHROTTLE_TARGET_CONCURRENCY": 8.0}),
+]
+
+
+def main():
+    server, url = start_in_subprocess(latency=LATENCY)
+    os.environ["WORLDOMETERS_URL"] = url
+    os.environ["HISTORY_PATH"] = os.path.join(tempfile.mkdtemp(prefix="corona-history-"), "history.sqlite3")
+
+    from corona_stats.spiders.countryhistoryspider import CountryHistorySpider
+    from scrap import get_service
+
+    service = get_service()
+    print(f"{'settings':<32}{'pages':>7}{'items':>7}{'wall (s)':>10}{'pages/s':>9}{'mean lat (ms)':>15}{'max lat (ms)':>14}")
+    for name, settings in CONFIGS:
+        spider_class = type("BenchSpider", (CountryHistorySpider,),
+                            {"custom_settings": {**CountryHistorySpider.custom_settings, **settings}})
+        streamed = []
+        start = time.perf_counter()
+        service.crawl(spider_class, on_item=lambda item: streamed.append(len(item["dates"]))).result()
+        wall = time.perf_counter() - start
+        stats = service.stats[spider_class.name]
+        print(f"{name:<32}{stats['country_pages/count']:>7}{len(streamed):>7}{wall:>10.2f}"
+              f"{stats['country_pages/per_second']:>9.1f}{stats['country_pages/latency_mean'] * 1e3:>15.1f}"
+              f"{stats['country_pages/latency_max'] * 1e3:>14.1f}")
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main()
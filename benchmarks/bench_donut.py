@@ -0,0 +1,70 @@
+"""
+Compares the previous donut figure (one go.Pie trace and one annotation per country, built with iterrows)
+with the single-trace donut read from CoronaDataset.donut_values: JSON payload size and build + serialization time.
+
+    python benchmarks/bench_donut.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import plotly.graph_objs as go
+from scrapy.http import HtmlResponse
+
+from corona_stats.spiders.coronaspider import CoronaSpiderSpider
+from dataset import CoronaDataset
+from fixture_page import load_fixture
+from helpers import create_clean_dataframe, plot_dount
+
+
+URL = "https://www.worldometers.info/coronavirus"
+
+
+def all_countries_donut(data):
+    """The previous plot_dount: a trace and an annotation per country."""
+    data = data.copy()
+    data['ActiveCasesPercent'] = data['ActiveCases'] / data['TotalCases'] * 100
+    data['RecoveredPercent'] = data['TotalRecovered'] / data['TotalCases'] * 100
+    data['DeathsPercent'] = data['TotalDeaths'] / data['TotalCases'] * 100
+    percent_cols = ['ActiveCasesPercent', 'RecoveredPercent', 'DeathsPercent']
+    data[percent_cols] = data[percent_cols].fillna(0)
+
+    fig = go.Figure()
+    for index, row in data.iterrows():
+        fig.add_trace(go.Pie(labels=['Active Cases', 'Recovered', 'Deaths'],
+                             values=[row['ActiveCasesPercent'], row['RecoveredPercent'], row['DeathsPercent']],
+                             hole=0.3, name=index))
+    fig.update_layout(title="COVID-19 Distribution by Country",
+                      annotations=[dict(text=c, x=0.5, y=0.5, font_size=20, showarrow=False) for c in data.index])
+    return fig
+
+
+def measure(build, repeat=5):
+    """This function returns the mean build + serialization time and the payload size in bytes."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        payload = build().to_json()
+    return (time.perf_counter() - start) / repeat, len(payload.encode("utf-8"))
+
+
+def main():
+    response = HtmlResponse(url=URL, body=load_fixture(), encoding="utf-8")
+    data = create_clean_dataframe(next(CoronaSpiderSpider(parser_mode="columnar").parse(response))["countries_frame"])
+    dataset = CoronaDataset(data)
+
+    print(f"{'donut':<26}{'payload (bytes)':>18}{'build + json (ms)':>20}")
+    for name, build in (("one trace per country", lambda: all_countries_donut(data)),
+                        ("single country", lambda: plot_dount(dataset, "USA"))):
+        elapsed, size = measure(build)
+        print(f"{name:<26}{size:>18,}{elapsed * 1e3:>20.2f}")
+
+    start = time.perf_counter()
+    for country in data.index:
+        dataset.donut_values[country]
+    print(f"per-country lookup: {(time.perf_counter() - start) / len(data) * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
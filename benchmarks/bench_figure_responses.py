@@ -0,0 +1,96 @@
+"""
+Compares the callback responses answered by Dash (the callback runs, Dash validates and JSON-encodes the figure
+and flask-compress compresses it on the fly) with the responses prepared once per snapshot (figure_cache.PreparedResponses):
+bytes on the wire and CPU time per request, for every option of the dropdowns of the server callbacks.
+The figures are cached in both cases (FigureCache), only the serving of the response is measured.
+
+It also times the serialization of the figures alone: the plotly JSON encoder used by Dash and orjson (encode_response).
+
+    python benchmarks/bench_figure_responses.py
+"""
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plotly.io.json import to_json_plotly
+
+from dash_requests import callback_body, fixture_snapshot
+from figure_cache import encode_response
+from helpers import plot_boxplots, plot_top_k_countries
+from layout import ATTRIBUTE_OPTIONS, BOX_ATTRIBUTE_OPTIONS, K_COUNTRIES_OPTIONS, load_display_data
+
+
+# Times every request is sent, per mode
+ROUNDS = 10
+
+# Every option of the dropdowns of the server callbacks
+REQUESTS = [
+    callback_body("k_countries_sorted.figure", [("select_attribute.value", attribute["value"]),
+                                                ("select_k_countries.value", n_countries["value"])])
+    for attribute in ATTRIBUTE_OPTIONS for n_countries in K_COUNTRIES_OPTIONS
+] + [
+    callback_body("continent_box_plot.figure", [("select_box_attribute.value", attribute["value"])])
+    for attribute in BOX_ATTRIBUTE_OPTIONS
+]
+
+
+def gauge(client, name):
+    """Reads a gauge of the /metrics of an app."""
+    metrics = client.get("/metrics").get_data(as_text=True)
+    return float(next(line.split()[1] for line in metrics.splitlines() if line.startswith(f"{name} ")))
+
+
+def serve(client, accept_encoding):
+    """Sends every request ROUNDS times, returns the mean bytes on the wire and the CPU milliseconds per request."""
+    sizes = []
+    start = time.process_time()
+    for _ in range(ROUNDS):
+        for body in REQUESTS:
+            response = client.post("/_dash-update-component", data=body, content_type="application/json",
+                                   headers={"Accept-Encoding": accept_encoding})
+            assert response.status_code == 200
+            sizes.append(len(response.data))
+    cpu = time.process_time() - start
+    return sum(sizes) / len(sizes), cpu / len(sizes) * 1e3
+
+
+def main():
+    store = SimpleNamespace(current=fixture_snapshot())
+
+    dash_client = load_display_data(store, prepare_responses=False).server.test_client()
+    prepared_client = load_display_data(store).server.test_client()
+    # Warm up: fills the figure caches and prepares the responses of the snapshot
+    serve(dash_client, "")
+    serve(prepared_client, "")
+    # The graphs without a dropdown are prepared too, REQUESTS does not send them
+    while gauge(prepared_client, "dash_prepared_responses") < len(REQUESTS):
+        time.sleep(0.1)
+
+    print(f"{len(REQUESTS)} input combinations x {ROUNDS} rounds")
+    print(f"{'responses':<22}{'encoding':<10}{'bytes/response':>16}{'CPU ms/request':>16}")
+    for name, client in [("Dash", dash_client), ("prepared", prepared_client)]:
+        for accept_encoding in ["identity", "gzip", "br"]:
+            size, cpu = serve(client, accept_encoding)
+            print(f"{name:<22}{accept_encoding:<10}{size:>16.0f}{cpu:>16.3f}")
+
+    dataset = store.current.dataset
+    figures = [("k_countries_sorted.figure", plot_top_k_countries(dataset, n_countries["value"], attribute["value"]).to_dict())
+               for attribute in ATTRIBUTE_OPTIONS for n_countries in K_COUNTRIES_OPTIONS]
+    figures += [("continent_box_plot.figure", plot_boxplots(dataset, attribute["value"]).to_dict())
+                for attribute in BOX_ATTRIBUTE_OPTIONS]
+    for name, encode in [("plotly JSON encoder", lambda output, figure: to_json_plotly(figure)),
+                         ("orjson", encode_response)]:
+        start = time.process_time()
+        for _ in range(ROUNDS):
+            for output, figure in figures:
+                encode(output, figure)
+        print(f"Serialization with {name}: {(time.process_time() - start) / (ROUNDS * len(figures)) * 1e3:.3f} ms/figure")
+    print(f"Preparing the {gauge(prepared_client, 'dash_prepared_responses'):.0f} responses of a snapshot: "
+          f"{gauge(prepared_client, 'dash_prepared_responses_seconds'):.2f} s, once")
+
+
+if __name__ == "__main__":
+    main()
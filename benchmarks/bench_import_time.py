@@ -0,0 +1,108 @@
+"""
+Import cost of the entry points, measured with `python -X importtime` in fresh interpreters (bytecode already cached):
+the total per entry point (median of the runs), the heavy modules each of them loads and the heaviest packages.
+
+  - wsgi : what a gunicorn web worker imports (through the master, see gunicorn.conf.py), it must not load the scraper
+  - app : the publisher (`python app.py publish`) and the development server, before it serves
+  - layout, refresher : the serving and the scraping side alone
+
+The runs can be saved to track the import cost over time: --save appends them (with the commit and the date)
+to baselines/import_time.jsonl, and every run is compared with the last saved one.
+
+    python benchmarks/bench_import_time.py [--runs 5] [--save]
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "import_time.jsonl")
+
+ENTRY_POINTS = ["wsgi", "app", "layout", "refresher"]
+
+# The modules a web worker should not need, or not at startup
+HEAVY_MODULES = ["scrapy", "twisted", "plotly.express", "dash_core_components", "dash_html_components", "dash", "pandas"]
+
+# A line of -X importtime: "import time: <self us> | <cumulative us> | <indentation><module>"
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_times(module):
+    """Imports a module in a fresh interpreter, returns {imported module: cumulative microseconds}."""
+    env = dict(os.environ, SHARED_SNAPSHOT_DIR=tempfile.gettempdir())
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            times[match.group(4)] = int(match.group(2))
+    return times
+
+
+def is_local(name):
+    """Tells if a module is one of the repository (not an installed package)."""
+    return os.path.exists(os.path.join(ROOT, f"{name}.py")) or os.path.isdir(os.path.join(ROOT, name))
+
+
+def git_commit():
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+
+def last_saved():
+    if not os.path.exists(HISTORY):
+        return None
+    with open(HISTORY) as file:
+        lines = [line for line in file if line.strip()]
+    return json.loads(lines[-1]) if lines else None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--save", action="store_true", help=f"append the results to {os.path.relpath(HISTORY, ROOT)}")
+    args = parser.parse_args()
+
+    # Compiles the bytecode of every module, the runs measure the imports only
+    for module in ENTRY_POINTS:
+        import_times(module)
+
+    totals, loaded, packages = {}, {}, {}
+    for module in ENTRY_POINTS:
+        runs = [import_times(module) for _ in range(args.runs)]
+        totals[module] = statistics.median(times[module] for times in runs) / 1e3
+        loaded[module] = [name for name in HEAVY_MODULES if name in runs[0]]
+        if module == ENTRY_POINTS[0]:
+            packages = {name: statistics.median(times.get(name, 0) for times in runs) / 1e3
+                        for name in runs[0] if "." not in name and not is_local(name)}
+
+    previous = last_saved()
+    print(f"Python {platform.python_version()}, median of {args.runs} runs"
+          + (f", compared with {previous['commit']} ({previous['date']})" if previous else ""))
+    print(f"{'entry point':<12}{'import (ms)':>12}{'saved (ms)':>12}  heavy modules loaded")
+    for module in ENTRY_POINTS:
+        saved = previous["totals"].get(module) if previous else None
+        saved = f"{saved:.0f}" if saved is not None else "-"
+        print(f"{module:<12}{totals[module]:>12.0f}{saved:>12}  {', '.join(loaded[module]) or '-'}")
+    heaviest = sorted(packages.items(), key=lambda item: -item[1])[:10]
+    print(f"Heaviest installed packages imported by {ENTRY_POINTS[0]}: "
+          + ", ".join(f"{name} {ms:.0f} ms" for name, ms in heaviest))
+
+    if args.save:
+        record = {"date": time.strftime("%Y-%m-%d"), "commit": git_commit(), "python": platform.python_version(),
+                  "totals": {module: round(ms, 1) for module, ms in totals.items()}, "loaded": loaded}
+        with open(HISTORY, "a") as file:
+            file.write(json.dumps(record) + "\n")
+        print(f"Saved in {os.path.relpath(HISTORY, ROOT)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Startup profile of the first page load: what the server does before the page can be rendered and what it sends.
+
+  - snapshot build: building a snapshot from a scrape (dataset, figures...), before anything can be served
+  - "/" and "/_dash-layout": time to the first byte of the response and size (raw and brotli)
+  - the requests of the initial callbacks the renderer sends once the layout is loaded, and their bytes
+
+The page is loaded from a fresh app (cold caches) through the Flask test client.
+
+    python benchmarks/bench_initial_page.py
+"""
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import brotli
+
+from dash_requests import TOTALS, dependency_inputs, fixture_countries, post_callback
+from layout import load_display_data
+from refresher import build_snapshot
+
+
+ROUNDS = 10
+
+
+def find_values(component, values):
+    """Collects the value (or data) of every component of a layout, by id."""
+    if isinstance(component, dict):
+        props = component.get("props", {})
+        if "id" in props:
+            values[props["id"]] = props.get("value", props.get("data"))
+        for child in (props.get("children"),):
+            find_values(child, values)
+    elif isinstance(component, list):
+        for child in component:
+            find_values(child, values)
+    return values
+
+
+def initial_callbacks(client, layout):
+    """Sends the initial calls of the server callbacks, like the renderer does, returns (requests, bytes)."""
+    values = find_values(layout, {})
+    n_requests = n_bytes = 0
+    for callback in client.get("/_dash-dependencies").get_json():
+        if callback.get("clientside_function"):
+            continue
+        response = post_callback(client, callback["output"], dependency_inputs(callback, values), changed=False,
+                                 headers={"Accept-Encoding": "br"})
+        n_requests += 1
+        n_bytes += len(response.data)
+    return n_requests, n_bytes
+
+
+def timed_get(client, path):
+    start = time.perf_counter()
+    response = client.get(path, headers={"Accept-Encoding": "identity"})
+    elapsed = time.perf_counter() - start
+    return elapsed * 1e3, response.data
+
+
+def main():
+    countries = fixture_countries()
+
+    start = time.perf_counter()
+    for version in range(ROUNDS):
+        snapshot = build_snapshot(TOTALS, countries, version)
+    build_ms = (time.perf_counter() - start) / ROUNDS * 1e3
+
+    rows = []
+    for path in ["/", "/_dash-layout"]:
+        first = None
+        timings = []
+        for _ in range(ROUNDS):
+            # A fresh app every time: the first page load of a worker
+            client = load_display_data(SimpleNamespace(current=snapshot)).server.test_client()
+            elapsed, body = timed_get(client, path)
+            timings.append(elapsed)
+            first = first or (elapsed, body)
+        rows.append((path, first[0], sorted(timings)[len(timings) // 2], len(first[1]), len(brotli.compress(first[1], quality=4))))
+
+    client = load_display_data(SimpleNamespace(current=snapshot)).server.test_client()
+    layout = client.get("/_dash-layout").get_json()
+    n_requests, n_bytes = initial_callbacks(client, layout)
+
+    print(f"Snapshot build: {build_ms:.1f} ms")
+    print(f"{'request':<16}{'first TTFB (ms)':>17}{'median TTFB (ms)':>18}{'bytes':>9}{'brotli bytes':>14}")
+    for path, first_ms, median_ms, size, compressed in rows:
+        print(f"{path:<16}{first_ms:>17.1f}{median_ms:>18.1f}{size:>9}{compressed:>14}")
+    print(f"Initial server callbacks: {n_requests} requests, {n_bytes} bytes (brotli)")
+
+
+if __name__ == "__main__":
+    main()
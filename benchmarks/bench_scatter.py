@@ -0,0 +1,63 @@
+"""
+Measures the build + serialization time and the JSON size of the two scatters (plot_scatter and idk)
+at 1k, 10k and 100k points, drawn with SVG, with WebGL, and with WebGL downsampled to 5k points.
+
+    python benchmarks/bench_scatter.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from helpers import idk, plot_scatter
+
+
+CONTINENTS = ["North America", "Asia", "Europe", "South America", "Africa", "Australia/Oceania"]
+
+
+def synthetic_points(n, seed=0):
+    """This function builds a dataset of n synthetic countries/regions with the columns used by the scatters."""
+    rng = np.random.default_rng(seed)
+    population = rng.integers(10_000, 1_400_000_000, n)
+    total_cases = (population * rng.uniform(0.01, 0.4, n)).astype("int64")
+    return pd.DataFrame({
+        "TotalCases": total_cases,
+        "TotalDeaths": (total_cases * rng.uniform(0, 0.02, n)).astype("int64"),
+        "Deaths/1M pop": rng.uniform(0, 6000, n),
+        "TotalTests": (total_cases * rng.uniform(1, 20, n)).astype("int64"),
+        "Population": population,
+        "Continent": pd.Categorical(rng.choice(CONTINENTS, n)),
+    }, index=[f"region {i}" for i in range(n)])
+
+
+def measure(build):
+    """This function returns the build + serialization time and the JSON size in bytes."""
+    start = time.perf_counter()
+    payload = build().to_json()
+    return time.perf_counter() - start, len(payload.encode("utf-8"))
+
+
+def main():
+    modes = [
+        ("svg", dict(webgl_threshold=float("inf"))),
+        ("webgl", dict(webgl_threshold=0)),
+        ("webgl, 5k sample", dict(webgl_threshold=0, max_points=5000)),
+    ]
+    # Warm-up: the first plotly express call pays for its lazy imports
+    plot_scatter(synthetic_points(10))
+
+    print(f"{'points':>8}  {'figure':<14}{'mode':<18}{'time (ms)':>12}{'json (KB)':>12}")
+    for n in (1_000, 10_000, 100_000):
+        data = synthetic_points(n)
+        for figure, plot in (("plot_scatter", plot_scatter), ("idk", idk)):
+            for mode, kwargs in modes:
+                elapsed, size = measure(lambda: plot(data, **kwargs))
+                print(f"{n:>8}  {figure:<14}{mode:<18}{elapsed * 1e3:>12.1f}{size / 1024:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Compares the two-spider scrape (CoronaSpiderSpider + TotalstatscoronapiderSpider) with the single-fetch
+CoronaPageSpider on the saved worldometers fixture.
+
+Every spider of the old setup downloads the page and builds its own parsed tree, so the old setup is modeled
+as one HtmlResponse per spider, while the combined spider gets a single one.
+
+    python benchmarks/bench_single_fetch.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.http import HtmlResponse
+
+from corona_stats.spiders.coronaspider import CoronaSpiderSpider
+from corona_stats.spiders.totalStatscoronapider import TotalstatscoronapiderSpider
+from corona_stats.spiders.coronapagespider import CoronaPageSpider
+from fixture_page import load_fixture
+
+
+URL = "https://www.worldometers.info/coronavirus"
+
+
+def fetch(body):
+    """This function simulates a download: every call hands out a fresh response that has not been parsed yet."""
+    return HtmlResponse(url=URL, body=body, encoding="utf-8")
+
+
+def run_spiders(spiders, body):
+    """This function feeds one fetched response per spider and returns (bytes fetched, items)."""
+    fetched, items = 0, []
+    for spider in spiders:
+        response = fetch(body)
+        fetched += len(response.body)
+        items.extend(spider.parse(response))
+    return fetched, items
+
+
+def build_trees(n_spiders, body):
+    """This function only fetches and builds the parsed tree, once per spider."""
+    for _ in range(n_spiders):
+        fetch(body).selector
+
+
+def best_time(func, repeat=20):
+    """This function returns the best wall time of func over repeat runs, with its last result."""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    body = load_fixture()
+
+    old_time, (old_bytes, old_items) = best_time(
+        lambda: run_spiders([CoronaSpiderSpider(), TotalstatscoronapiderSpider()], body))
+    new_time, (new_bytes, new_items) = best_time(lambda: run_spiders([CoronaPageSpider()], body))
+
+    old_tree, _ = best_time(lambda: build_trees(2, body))
+    new_tree, _ = best_time(lambda: build_trees(1, body))
+
+    # The coronapage totals also carry the content hash and the parse time of the page
+    counters = ["TotalCase", "TotalDeaths", "TotalRecovered"]
+    old_countries, old_totals = old_items
+    new_countries, new_totals = new_items
+    assert old_countries == new_countries and [old_totals[key] for key in counters] == [new_totals[key] for key in counters], \
+        "both setups must yield the same data"
+
+    print(f"{'setup':<28}{'bytes fetched':>16}{'html parse (ms)':>18}{'total parse (ms)':>18}")
+    print(f"{'two spiders':<28}{old_bytes:>16,}{old_tree * 1e3:>18.2f}{old_time * 1e3:>18.2f}")
+    print(f"{'single fetch (coronapage)':<28}{new_bytes:>16,}{new_tree * 1e3:>18.2f}{new_time * 1e3:>18.2f}")
+    print(f"bytes ratio: {new_bytes / old_bytes:.2f}, html parse ratio: {new_tree / old_tree:.2f}, "
+          f"total parse ratio: {new_time / old_time:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Compares the memory footprint of the old object dtype dataset (pd.DataFrame(countries_data).transpose())
+with the typed one built by create_clean_dataframe from corona_stats.schema.
+
+    python benchmarks/bench_typed_dataset.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from scrapy.http import HtmlResponse
+
+from corona_stats.spiders.coronaspider import CoronaSpiderSpider
+from fixture_page import build_page, load_fixture
+from helpers import create_clean_dataframe, memory_footprint
+
+
+URL = "https://www.worldometers.info/coronavirus"
+
+
+def main():
+    print(f"{'page':<16}{'rows':>8}{'object (KB)':>14}{'typed (KB)':>14}{'ratio':>8}{'groupby obj (ms)':>18}{'groupby typed (ms)':>20}")
+    for label, body in (("fixture", load_fixture()), ("10x synthetic", build_page(2300).encode("utf-8"))):
+        response = HtmlResponse(url=URL, body=body, encoding="utf-8")
+        countries_data = next(CoronaSpiderSpider().parse(response))
+
+        untyped = pd.DataFrame(countries_data).transpose()
+        typed = create_clean_dataframe(countries_data)
+
+        timings = []
+        for data in (untyped, typed):
+            start = time.perf_counter()
+            for _ in range(20):
+                data.groupby("Continent", observed=True)[["TotalCases", "TotalDeaths"]].sum()
+            timings.append((time.perf_counter() - start) / 20)
+
+        before, after = memory_footprint(untyped), memory_footprint(typed)
+        print(f"{label:<16}{len(typed):>8}{before / 1024:>14.1f}{after / 1024:>14.1f}{before / after:>8.1f}"
+              f"{timings[0] * 1e3:>18.2f}{timings[1] * 1e3:>20.2f}")
+
+
+if __name__ == "__main__":
+    main()
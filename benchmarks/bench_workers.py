@@ -0,0 +1,147 @@
+"""
+Load test of the production serving mode (wsgi.py under gunicorn, see gunicorn.conf.py) for a growing number of workers:
+requests/s, latencies and the memory of every worker (RSS, and PSS/USS which do not count the shared pages twice).
+
+A snapshot of the saved fixture is published once in a temporary directory, the publisher is not started
+(START_PUBLISHER=0): every worker attaches to the same memory-mapped dataset.
+The clients run in their own processes, each of them sends the requests of REQUESTS in a loop on a keep-alive connection:
+the server callbacks with several inputs, and a page load every len(REQUESTS) requests.
+
+    python benchmarks/bench_workers.py [--workers 1 2 4] [--clients 8] [--duration 10]
+"""
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import psutil
+
+from dash_requests import callback_body, fixture_snapshot
+
+
+# (method, path, body) of the requests sent in a loop by every client
+REQUESTS = [("GET", "/", None)] + [
+    ("POST", "/_dash-update-component", callback_body(output, inputs)) for output, inputs in [
+        ("k_countries_sorted.figure", [("select_attribute.value", "TotalCases"), ("select_k_countries.value", 10)]),
+        ("k_countries_sorted.figure", [("select_attribute.value", "Deaths/1M pop"), ("select_k_countries.value", 50)]),
+        ("continent_box_plot.figure", [("select_box_attribute.value", "Deaths/1M pop")]),
+        ("continent_box_plot.figure", [("select_box_attribute.value", "Tests/1Mpop")]),
+        ("k_countries_sorted.figure", [("select_attribute.value", "NewCases"), ("select_k_countries.value", 25)]),
+    ]
+]
+
+
+def publish_fixture(directory):
+    """This function publishes the snapshot of the saved fixture page, the workers attach to it."""
+    from shared_snapshot import publish_snapshot
+
+    publish_snapshot(fixture_snapshot(), directory)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(n_workers, port, shared_dir):
+    env = dict(os.environ, SHARED_SNAPSHOT_DIR=shared_dir, START_PUBLISHER="0")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--workers", str(n_workers),
+         "--bind", f"127.0.0.1:{port}", "--log-level", "warning", "wsgi:server"],
+        cwd=ROOT, env=env,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            connection.request("GET", "/")
+            if connection.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start")
+
+
+def run_client(port, duration, offset):
+    """Sends the requests in a loop for `duration` seconds, returns the latencies (seconds) and the errors."""
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    headers = {"Content-Type": "application/json"}
+    latencies, errors, i = [], 0, offset
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        method, path, body = REQUESTS[i % len(REQUESTS)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    return latencies, errors
+
+
+def worker_memory(master):
+    """The (rss, pss, uss) of every worker of a gunicorn master, in MB."""
+    memory = []
+    for worker in master.children():
+        info = worker.memory_full_info()
+        memory.append((info.rss / 2 ** 20, info.pss / 2 ** 20, info.uss / 2 ** 20))
+    return memory
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    shared_dir = tempfile.mkdtemp(prefix="corona-shared-")
+    publish_fixture(shared_dir)
+
+    print(f"{args.clients} clients, {args.duration:.0f}s per run")
+    print(f"{'workers':>7}{'req/s':>9}{'p50 (ms)':>10}{'p95 (ms)':>10}{'errors':>8}"
+          f"{'RSS/worker (MB)':>17}{'PSS/worker (MB)':>17}{'USS/worker (MB)':>17}")
+    with ProcessPoolExecutor(max_workers=args.clients, mp_context=get_context("spawn")) as clients:
+        for n_workers in args.workers:
+            port = free_port()
+            server = start_gunicorn(n_workers, port, shared_dir)
+            try:
+                # Every worker attaches the snapshot and fills its figure cache before the measure
+                list(clients.map(run_client, [port] * args.clients, [2.0] * args.clients, range(args.clients)))
+                start = time.perf_counter()
+                results = list(clients.map(run_client, [port] * args.clients, [args.duration] * args.clients,
+                                           range(args.clients)))
+                wall = time.perf_counter() - start
+                memory = np.array(worker_memory(psutil.Process(server.pid)))
+            finally:
+                server.terminate()
+                server.wait()
+            latencies = np.concatenate([latencies for latencies, _ in results]) * 1e3
+            errors = sum(errors for _, errors in results)
+            rss, pss, uss = memory.mean(axis=0)
+            print(f"{n_workers:>7}{len(latencies) / wall:>9.0f}{np.percentile(latencies, 50):>10.1f}"
+                  f"{np.percentile(latencies, 95):>10.1f}{errors:>8}{rss:>17.1f}{pss:>17.1f}{uss:>17.1f}")
+
+
+if __name__ == "__main__":
+    main()
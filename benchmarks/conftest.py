@@ -0,0 +1,81 @@
+"""
+Shared fixtures of the benchmark suite: the pages, datasets and snapshots at the real size (the saved fixture)
+and at 10x/100x synthetic row counts (fixture_page.build_page, always the same page for a size).
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+import pytest
+from scrapy.http import HtmlResponse
+
+from dash_requests import URL
+from fixture_page import build_page, load_fixture
+
+
+# Row count multipliers of the saved fixture (230 countries)
+FACTORS = [int(factor) for factor in os.environ.get("BENCH_FACTORS", "1,10,100").split(",")]
+
+# Timed rounds per size, the 100x runs take seconds each
+ROUNDS = {1: 30, 10: 8, 100: 3}
+
+_pages = {}
+
+
+def page_body(factor):
+    """This function returns the page with factor times the rows of the saved fixture, built once per session."""
+    if factor not in _pages:
+        _pages[factor] = load_fixture() if factor == 1 else build_page(230 * factor).encode("utf-8")
+    return _pages[factor]
+
+
+def fetch(factor):
+    """This function returns a fresh response (its html not parsed yet) for the page of a size."""
+    return HtmlResponse(url=URL, body=page_body(factor), encoding="utf-8")
+
+
+def scale(data, factor):
+    """This function repeats a dataset factor times, with unique country names."""
+    if factor == 1:
+        return data
+    scaled = pd.concat([data] * factor)
+    scaled.index = [f"{country} {i // len(data)}" if i >= len(data) else country for i, country in enumerate(scaled.index)]
+    return scaled
+
+
+@pytest.fixture(scope="session", params=FACTORS, ids=[f"{factor}x" for factor in FACTORS])
+def factor(request):
+    return request.param
+
+
+@pytest.fixture
+def run(benchmark, factor):
+    """Runs a function under the benchmark, with a number of rounds suited to the dataset size."""
+    def run(func, *args, **kwargs):
+        return benchmark.pedantic(func, args=args, kwargs=kwargs, rounds=ROUNDS.get(factor, 3), warmup_rounds=1)
+    return run
+
+
+@pytest.fixture(scope="session")
+def clean_data(factor):
+    """The cleaned dataset parsed from the page of the size."""
+    from corona_stats.spiders.coronaspider import CoronaSpiderSpider
+    from helpers import create_clean_dataframe
+
+    return create_clean_dataframe(next(CoronaSpiderSpider(parser_mode="columnar").parse(fetch(factor)))["countries_frame"])
+
+
+@pytest.fixture(scope="session")
+def dataset(clean_data):
+    from dataset import CoronaDataset
+
+    return CoronaDataset(clean_data)
+
+
+@pytest.fixture(scope="session")
+def snapshot(factor):
+    from dash_requests import fixture_snapshot
+
+    return fixture_snapshot(fetch(factor))
@@ -0,0 +1,71 @@
+"""
+Helpers of the dashboard benchmarks: the /_dash-update-component requests the Dash renderer sends,
+and the snapshot of the saved fixture page the apps under test serve.
+
+The inputs of a callback are given as ("component.property", value) pairs, in the order of its Input list.
+The scraping side (scrapy, the spiders) is only imported to build a snapshot, the load test clients stay light.
+"""
+import json
+
+
+URL = "https://www.worldometers.info/coronavirus"
+
+# The headline counters of the fixture snapshots, the callbacks do not read them
+TOTALS = {"TotalCase": "0", "TotalDeaths": "0", "TotalRecovered": "0"}
+
+
+def callback_body(output, inputs, changed=True):
+    """
+    This function builds the JSON body of a callback request, as the renderer sends it.
+
+    Parameters:
+        output : str
+            The output of the callback, "component.property".
+        inputs : list of (str, object)
+            The ("component.property", value) of every input of the callback.
+        changed : bool, Default=True
+            The first input was changed by the user, else the initial call of the page load (no input changed).
+    Returns:
+        body : str
+            The request body.
+    """
+    component, prop = output.split(".")
+    return json.dumps({
+        "output": output,
+        "outputs": {"id": component, "property": prop},
+        "inputs": [{"id": input_id.split(".")[0], "property": input_id.split(".")[1], "value": value}
+                   for input_id, value in inputs],
+        "changedPropIds": [inputs[0][0]] if changed else [],
+    })
+
+
+def dependency_inputs(callback, values):
+    """This function returns the inputs of a callback listed by /_dash-dependencies, with their value by component id."""
+    return [(f"{item['id']}.{item['property']}", values.get(item["id"])) for item in callback["inputs"]]
+
+
+def post_callback(client, output, inputs, changed=True, headers=None):
+    """This function sends a callback request through a Flask test client and returns its (200) response."""
+    response = client.post("/_dash-update-component", data=callback_body(output, inputs, changed),
+                           content_type="application/json", headers=headers)
+    assert response.status_code == 200, response.data
+    return response
+
+
+def fixture_countries(response=None):
+    """This function parses the countries data of the saved fixture page (or of a response of a page)."""
+    from scrapy.http import HtmlResponse
+
+    from corona_stats.spiders.coronaspider import CoronaSpiderSpider
+    from fixture_page import load_fixture
+
+    if response is None:
+        response = HtmlResponse(url=URL, body=load_fixture(), encoding="utf-8")
+    return next(CoronaSpiderSpider(parser_mode="columnar").parse(response))["countries_frame"]
+
+
+def fixture_snapshot(response=None, version=1):
+    """This function builds the snapshot of the saved fixture page (or of a response of a page), as a scrape does."""
+    from refresher import build_snapshot
+
+    return build_snapshot(TOTALS, fixture_countries(response), version)
@@ -0,0 +1,207 @@
+"""
+This module builds a worldometers-like HTML page used as a saved fixture by the benchmarks.
+
+The page mirrors the markup the spiders rely on: the three "maincounter-number" blocks and the
+"main_table_countries_today" table (same header <br> splits, 22 <td> per country row, continent rows hidden).
+build_country_page builds the page of a country, with its daily history in Highcharts scripts.
+
+Run it directly to (re)write the saved fixture:
+    python benchmarks/fixture_page.py
+"""
+import datetime
+import itertools
+import json
+import os
+import random
+
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+FIXTURE_PATH = os.path.join(FIXTURE_DIR, "worldometers.html")
+
+CONTINENTS = ["North America", "Asia", "Europe", "South America", "Africa", "Australia/Oceania"]
+
+COUNTRIES = [
+    ("USA", "North America"), ("India", "Asia"), ("France", "Europe"), ("Germany", "Europe"),
+    ("Brazil", "South America"), ("S. Korea", "Asia"), ("Japan", "Asia"), ("Italy", "Europe"),
+    ("UK", "Europe"), ("Russia", "Europe"), ("Turkey", "Asia"), ("Spain", "Europe"),
+    ("Australia", "Australia/Oceania"), ("Vietnam", "Asia"), ("Taiwan", "Asia"), ("Argentina", "South America"),
+    ("Netherlands", "Europe"), ("Mexico", "North America"), ("Iran", "Asia"), ("Indonesia", "Asia"),
+    ("Poland", "Europe"), ("Colombia", "South America"), ("Austria", "Europe"), ("Portugal", "Europe"),
+    ("Greece", "Europe"), ("Ukraine", "Europe"), ("Chile", "South America"), ("Malaysia", "Asia"),
+    ("Canada", "North America"), ("Israel", "Asia"), ("Thailand", "Asia"), ("Belgium", "Europe"),
+    ("Peru", "South America"), ("South Africa", "Africa"), ("Morocco", "Africa"), ("Egypt", "Africa"),
+    ("Nigeria", "Africa"), ("Kenya", "Africa"), ("New Zealand", "Australia/Oceania"), ("Fiji", "Australia/Oceania"),
+]
+
+HEADERS = [
+    "#", "Country,<br>Other", "Total<br>Cases", "New<br>Cases", "Total<br>Deaths", "New<br>Deaths",
+    "Total<br>Recovered", "New<br>Recovered", "Active<br>Cases", "Serious,<br>Critical",
+    "Tot&nbsp;Cases/<br>1M pop", "Deaths/<br>1M pop", "Total<br>Tests", "Tests/<br>\n1M pop\n",
+    "Population", "Continent", "1 Case<br>\nevery X<br>\nppl", "1 Death<br>every X<br> ppl",
+    "1 Test<br>every X<br> ppl", "New Cases/1M pop", "New Deaths/1M pop", "Active Cases/1M pop",
+]
+
+
+def _fmt(value):
+    """This function formats an integer the way worldometers does (thousands separated by commas)."""
+    return "{:,}".format(int(value))
+
+
+def _synthetic_name(i):
+    """This function returns a digit-free synthetic country name, the parser treats any digit as a number."""
+    letters = ""
+    i += 1
+    while i:
+        i, rem = divmod(i - 1, 26)
+        letters = chr(ord("a") + rem) + letters
+    return f"Testland {letters.capitalize()}"
+
+
+def iter_countries(n_countries):
+    """This function yields (name, continent) pairs, real names first and synthetic ones after."""
+    for i in range(n_countries):
+        if i < len(COUNTRIES):
+            yield COUNTRIES[i]
+        else:
+            yield _synthetic_name(i), CONTINENTS[i % len(CONTINENTS)]
+
+
+def build_row(rank, name, continent, rng):
+    """This function builds the <tr> of a single country."""
+    population = rng.randint(10_000, 1_400_000_000)
+    total_cases = rng.randint(10, max(11, population // 3))
+    total_deaths = rng.randint(0, max(1, total_cases // 50))
+    recovered_known = rng.random() > 0.1
+    total_recovered = rng.randint(0, total_cases - total_deaths) if recovered_known else None
+    active = total_cases - total_deaths - total_recovered if recovered_known else None
+    new_cases = rng.randint(1, 5000) if rng.random() > 0.6 else None
+    new_deaths = rng.randint(1, 50) if new_cases and rng.random() > 0.5 else None
+    new_recovered = rng.randint(1, 5000) if new_cases and rng.random() > 0.5 else None
+    serious = rng.randint(1, 9000) if rng.random() > 0.4 else None
+    total_tests = rng.randint(total_cases, total_cases * 20) if rng.random() > 0.05 else None
+
+    cells = [
+        str(rank),
+        f'<a class="mt_a" href="country/{country_slug(name)}/">{name}</a>',
+        _fmt(total_cases),
+        f"+{_fmt(new_cases)}" if new_cases else "",
+        _fmt(total_deaths) if total_deaths else "",
+        f"+{_fmt(new_deaths)}" if new_deaths else "",
+        _fmt(total_recovered) if recovered_known else "N/A",
+        f"+{_fmt(new_recovered)}" if new_recovered else "",
+        _fmt(active) if recovered_known else "N/A",
+        _fmt(serious) if serious else "",
+        _fmt(total_cases * 1_000_000 // population),
+        _fmt(total_deaths * 1_000_000 // population) if total_deaths else "",
+        _fmt(total_tests) if total_tests else "",
+        _fmt(total_tests * 1_000_000 // population) if total_tests else "",
+        f'<a href="/world-population/{name.lower().replace(" ", "-")}-population/">{_fmt(population)}</a>',
+        continent,
+        _fmt(population // total_cases) if total_cases else "",
+        _fmt(population // total_deaths) if total_deaths else "",
+        _fmt(population // total_tests) if total_tests else "",
+        "", "", _fmt(active * 1_000_000 // population) if recovered_known else "N/A",
+    ]
+    tds = "".join(f'<td style="text-align:right">{cell}</td>' for cell in cells)
+    return f'<tr style="">{tds}</tr>\n', (total_cases, total_deaths, total_recovered or 0)
+
+
+def build_page(n_countries=230, seed=2024):
+    """
+    This function builds the whole fixture page.
+
+    Parameters:
+        n_countries : int, Default=230
+            The number of country rows of the main table.
+        seed : int, Default=2024
+            The seed used for the random numbers, the same seed always gives the same page.
+    Returns:
+        page : str
+            The HTML page.
+    """
+    rng = random.Random(seed)
+    rows = []
+    totals = [0, 0, 0]
+    for rank, (name, continent) in enumerate(iter_countries(n_countries), start=1):
+        row, counts = build_row(rank, name, continent, rng)
+        rows.append(row)
+        totals = [t + c for t, c in zip(totals, counts)]
+
+    continent_rows = "".join(
+        f'<tr class="total_row_world row_continent" data-continent="{c}" style="display: none">'
+        f'<td></td><td><nobr>{c}</nobr></td></tr>\n' for c in CONTINENTS
+    )
+    headers = "".join(f"<th>{h}</th>" for h in HEADERS)
+    counters = "".join(
+        f'<div id="maincounter-wrap"><h1>{label}</h1><div class="maincounter-number">'
+        f'<span style="color:#aaa">{_fmt(value)} </span></div></div>\n'
+        for label, value in zip(["Coronavirus Cases:", "Deaths:", "Recovered:"], totals)
+    )
+    return (
+        "<!DOCTYPE html>\n<html><head><title>COVID - Coronavirus Statistics - Worldometer</title></head><body>\n"
+        f"{counters}"
+        '<table id="main_table_countries_today" class="table table-bordered table-hover main_table_countries">\n'
+        f"<thead><tr>{headers}</tr></thead>\n<tbody>\n{continent_rows}{''.join(rows)}</tbody>\n</table>\n"
+        "</body></html>\n"
+    )
+
+
+def country_slug(name):
+    """This function returns the path component of a country page, as linked from the main table."""
+    return name.lower().replace(" ", "-")
+
+
+def build_country_page(name, n_days=900, seed=2024):
+    """
+    This function builds the page of a country (/coronavirus/country/<slug>/).
+
+    Like on worldometers, the daily history is only found in the Highcharts scripts of the page:
+    the dates in xAxis.categories and the values in the data of the first series.
+
+    Parameters:
+        name : str
+            The country name, as in the main table.
+        n_days : int, Default=900
+            The number of days of history.
+        seed : int, Default=2024
+            The same seed and name always give the same page.
+    Returns:
+        page : str
+            The HTML page.
+    """
+    rng = random.Random(f"{seed}-{name}")
+    start = datetime.date(2020, 2, 15)
+    dates = [(start + datetime.timedelta(days=day)).strftime("%b %d, %Y") for day in range(n_days)]
+    new_cases = [rng.randint(0, 5000) for _ in range(n_days)]
+    new_deaths = [rng.randint(0, cases // 50 + 1) for cases in new_cases]
+    charts = {
+        "coronavirus-cases-linear": list(itertools.accumulate(new_cases)),
+        "coronavirus-deaths-linear": list(itertools.accumulate(new_deaths)),
+        "graph-cases-daily": new_cases,
+        "graph-deaths-daily": new_deaths,
+    }
+    scripts = "".join(
+        f"<script type=\"text/javascript\">\n    Highcharts.chart('{chart}', {{\n"
+        f"        chart: {{ type: 'line' }},\n"
+        f"        xAxis: {{ categories: {json.dumps(dates)} }},\n"
+        f"        series: [{{ name: 'Cases', color: '#33CCFF', data: {json.dumps(values)} }}]\n"
+        f"    }});\n</script>\n"
+        for chart, values in charts.items()
+    )
+    return (
+        f"<!DOCTYPE html>\n<html><head><title>{name} COVID - Coronavirus Statistics - Worldometer</title></head>"
+        f"<body>\n<h1>{name}</h1>\n{scripts}</body></html>\n"
+    )
+
+
+def load_fixture():
+    """This function returns the saved fixture page as bytes."""
+    with open(FIXTURE_PATH, "rb") as file:
+        return file.read()
+
+
+if __name__ == "__main__":
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    with open(FIXTURE_PATH, "w", encoding="utf-8") as file:
+        file.write(build_page())
+    print(f"Fixture written to {FIXTURE_PATH}")
@@ -0,0 +1,126 @@
+"""
+A local HTTP stand-in for worldometers, serving the saved fixture page and a generated page for every country
+linked from it (/coronavirus/country/<slug>/, see fixture_page.build_country_page).
+
+The main page answers conditional requests like a real server: it carries an ETag and a Last-Modified header,
+and a request whose If-None-Match (or If-Modified-Since) still matches gets an empty 304 Not Modified.
+The number of requests and of body bytes sent are counted per status.
+"""
+import hashlib
+import multiprocessing
+import re
+import threading
+import time
+from collections import Counter
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fixture_page import build_country_page, country_slug, iter_countries, load_fixture
+
+
+COUNTRY_PATH_RE = re.compile(r"^/coronavirus/country/([^/]+)/$")
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """
+    The stand-in server, `body` can be replaced between two crawls to simulate an update of the page.
+    Every country page is answered after `latency` seconds, to simulate a remote server.
+    """
+
+    # The default backlog (5) drops the connections of a concurrent crawl, they are retried a second later
+    request_queue_size = 128
+
+    def __init__(self, body=None, latency=0.0, n_countries=230):
+        super().__init__(("127.0.0.1", 0), FixtureHandler)
+        self.latency = latency
+        self.requests = Counter()
+        self.bytes_sent = Counter()
+        self.set_body(load_fixture() if body is None else body)
+        self.countries = {country_slug(name): name for name, _ in iter_countries(n_countries)}
+        self._country_pages = {}
+
+    def country_page(self, slug):
+        """This function returns the page of a country (built on first request), None for an unknown country."""
+        if slug not in self.countries:
+            return None
+        if slug not in self._country_pages:
+            self._country_pages[slug] = build_country_page(self.countries[slug]).encode("utf-8")
+        return self._country_pages[slug]
+
+    def set_body(self, body):
+        self.body = body.encode("utf-8") if isinstance(body, str) else body
+        self.etag = '"%s"' % hashlib.sha1(self.body).hexdigest()
+        self.last_modified = formatdate(usegmt=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}/coronavirus"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        country = COUNTRY_PATH_RE.match(self.path)
+        if self.path == "/robots.txt":
+            self._send(404, b"", validators=False)
+        elif country is not None:
+            time.sleep(server.latency)
+            page = server.country_page(country.group(1))
+            if page is None:
+                self._send(404, b"", validators=False)
+            else:
+                self._send(200, page, validators=False)
+        elif self._not_modified():
+            self._send(304, b"")
+        else:
+            self._send(200, server.body)
+
+    def _not_modified(self):
+        server = self.server
+        if "If-None-Match" in self.headers:
+            return self.headers["If-None-Match"] == server.etag
+        if "If-Modified-Since" in self.headers:
+            try:
+                return parsedate_to_datetime(self.headers["If-Modified-Since"]) >= parsedate_to_datetime(server.last_modified)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _send(self, status, body, validators=True):
+        self.send_response(status)
+        if validators:
+            self.send_header("ETag", self.server.etag)
+            self.send_header("Last-Modified", self.server.last_modified)
+        if status != 304:
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.requests[status] += 1
+        self.server.bytes_sent[status] += len(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve(urls, kwargs):
+    server = FixtureServer(**kwargs)
+    urls.put(server.url)
+    server.serve_forever()
+
+
+def start_in_subprocess(**kwargs):
+    """
+    This function runs a FixtureServer (built with kwargs) in a child process, so the server threads do not
+    compete for the GIL with the code being measured. It returns (process, url), terminate the process when done.
+    """
+    context = multiprocessing.get_context("spawn")
+    urls = context.Queue()
+    process = context.Process(target=_serve, args=(urls, kwargs), daemon=True)
+    process.start()
+    return process, urls.get(timeout=30)
@@ -0,0 +1,79 @@
+"""
+The original row by row parser of the countries table, kept as the reference the header-driven parsers
+of CoronaSpiderSpider (parser_mode="columnar" and "items") are measured against. It relies on the position
+of every cell and <th> line, the spiders no longer use it.
+"""
+import re
+from collections import defaultdict
+
+
+def parse_rows(response):
+    """
+    This function parses the countries table row by row.
+
+    Returns:
+        countries_data : dict
+            {country: {column name: value}}, the numbers as float and the other cells as str.
+    """
+    corona_table = response.xpath('//table[@id="main_table_countries_today"]')
+    column_names = get_table_column_names(corona_table)
+
+    countries_data = defaultdict(dict)
+    for tr in corona_table.xpath('.//tr[@style=""]'):
+        td_contents = [td.xpath('string()').get().strip() for td in tr.xpath('.//td')]
+        line = get_country_data('\n'.join(td_contents))
+        countries_data[line[0]] = dict(zip(column_names, line[1:]))
+    return countries_data
+
+
+def get_table_column_names(corona_table):
+    """
+    This function extracts the <th> texts of the table and returns the formatted column names.
+    """
+    hs = ""
+    # Printing each content of <th> on a single line
+    for header in corona_table.xpath('.//tr/th'):
+        # Extracting all text content within <th> and concatenating them into one line
+        header_text = ''.join(header.xpath('.//text()').getall())
+        hs += header_text.strip() + '\n'
+    return get_column_names(hs)
+
+
+def get_column_names(tr):
+    """
+    This function return a well formatted list for the column names.
+    """
+    line = tr.strip("\n#").strip().split("\n")
+    line[12] += line[13]
+    line[12] = ''.join(line[12].split())
+    line[16] = line[16] + line[17] + line[18]
+    line.pop(13)
+    line.pop(16)
+    line.pop(16)
+    return line[1:-1]
+
+
+def get_country_data(country_line):
+    """
+    This function formats a given input line parsed from an html page.
+
+    Parameters:
+        country_line : str
+            it is a row table row, that contains the data.
+
+    Returns:
+        line : list
+            A list containing all the useful information retrieved.
+    """
+    line = country_line.strip().split("\n")
+    line.pop(0)
+
+    line[15] = line[15] + line[16] + line[17]
+    line.pop(16)
+    line.pop(16)
+
+    for i, element in zip(range(len(line)), line):
+        if re.search("[1-9]+", element):
+            line[i] = float(''.join(line[i].strip('+').split(",")))
+
+    return line[:-1]
@@ -0,0 +1,64 @@
+"""
+Benchmarks of the dashboard: every plot_* function of helpers.py, and every callback of layout.load_display_data
+answered through the Dash endpoint (lookup, figure build and JSON response), without the figure cache.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from dash_requests import post_callback
+from figure_cache import FigureCache
+from helpers import idk, plot_boxplots, plot_continent_data, plot_dount, plot_scatter, plot_top_k_countries
+from layout import is_stale_figure, load_display_data
+
+
+@pytest.mark.parametrize("keyword", ["New", "Total"])
+def test_plot_continent_data(run, dataset, keyword):
+    run(plot_continent_data, dataset, keyword)
+
+
+@pytest.mark.parametrize("n_countries", [10, 50])
+def test_plot_top_k_countries(run, dataset, n_countries):
+    run(plot_top_k_countries, dataset, n_countries, "TotalCases")
+
+
+def test_plot_boxplots(run, dataset):
+    run(plot_boxplots, dataset, "Deaths/1M pop")
+
+
+def test_plot_scatter(run, clean_data):
+    run(plot_scatter, clean_data)
+
+
+def test_plot_dount(run, dataset):
+    run(plot_dount, dataset, "USA")
+
+
+def test_idk(run, clean_data):
+    run(idk, clean_data)
+
+
+# (output, inputs) of every server callback of load_display_data, the graphs without a dropdown are drawn
+# for the version of the snapshot in the page (the snapshot fixture is version 1)
+CALLBACKS = {
+    "k_countries_sorted": ("k_countries_sorted.figure",
+                           [("select_attribute.value", "TotalCases"), ("select_k_countries.value", 50)]),
+    "continent_box_plot": ("continent_box_plot.figure", [("select_box_attribute.value", "Deaths/1M pop")]),
+    "totalcases_by_totaldeath_for_each_country": ("totalcases_by_totaldeath_for_each_country.figure",
+                                                  [("snapshot_version.data", 1)]),
+    "gh": ("gh.figure", [("snapshot_version.data", 1)]),
+}
+
+
+@pytest.fixture(scope="session")
+def client(snapshot):
+    # A cache that keeps nothing and no prepared responses: every request runs its callback and builds its figure
+    app = load_display_data(SimpleNamespace(current=snapshot), FigureCache(maxsize=0, is_stale=is_stale_figure),
+                            prepare_responses=False)
+    return app.server.test_client()
+
+
+@pytest.mark.parametrize("callback", list(CALLBACKS))
+def test_callback(run, client, callback):
+    output, inputs = CALLBACKS[callback]
+    run(post_callback, client, output, inputs)
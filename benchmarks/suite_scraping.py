@@ -0,0 +1,37 @@
+"""Benchmarks of the scraping path: parsing the page (every parser mode) and cleaning the dataset."""
+import pytest
+
+from conftest import fetch
+from corona_stats.spiders.coronaspider import CoronaSpiderSpider
+from helpers import create_clean_dataframe
+from row_parser import get_country_data, parse_rows
+
+
+def parse(parser_mode, response):
+    # "rows" is the original parser, see row_parser.py
+    if parser_mode == "rows":
+        return [parse_rows(response)]
+    return list(CoronaSpiderSpider(parser_mode=parser_mode).parse(response))
+
+
+@pytest.mark.parametrize("parser_mode", ["rows", "columnar", "items"])
+def test_parse(run, factor, parser_mode):
+    # A fresh response per round: parsing the html is part of the measure
+    items = run(lambda: parse(parser_mode, fetch(factor)))
+    assert items
+
+
+def test_get_country_data(run, factor):
+    table = fetch(factor).xpath('//table[@id="main_table_countries_today"]')
+    lines = ['\n'.join(td.xpath('string()').get().strip() for td in tr.xpath('.//td'))
+             for tr in table.xpath('.//tr[@style=""]')]
+    rows = run(lambda: [get_country_data(line) for line in lines])
+    assert len(rows) == len(lines)
+
+
+@pytest.mark.parametrize("source", ["rows", "columnar"])
+def test_create_clean_dataframe(run, factor, source):
+    raw = parse(source, fetch(factor))[0]
+    raw = raw["countries_frame"] if source == "columnar" else raw
+    data = run(create_clean_dataframe, raw)
+    assert len(data) == 230 * factor
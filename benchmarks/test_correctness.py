@@ -0,0 +1,441 @@
+"""
+Correctness checks of the optimizations the benchmarks measure, run with the suite (python -m pytest):
+
+  - CoronaDataset.updated gives the same dataset as a full rebuild from the new data, and FigureCache drops
+    the figures a new version makes stale (all of them without a delta) and only those
+  - ConditionalFetchMiddleware revalidates the page against the fixture server and hands back the cached body on a 304
+  - HistoryStore answers the time range queries of a country and of a continent, and the history pipeline
+    only keeps the scrapes parsed in full
+  - the prepared responses are measured like the callback calls they replace, the refresh metrics are served
+  - SharedSnapshotStore never blocks a request and attaches every snapshot published, even by a restarted publisher
+"""
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+import pytest
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+
+from conftest import fetch
+from dash_requests import fixture_snapshot, post_callback
+from dataset import CoronaDataset, diff_rows
+from fixture_server import FixtureServer
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def fixture_data():
+    from corona_stats.spiders.coronaspider import CoronaSpiderSpider
+    from helpers import create_clean_dataframe
+
+    return create_clean_dataframe(next(CoronaSpiderSpider(parser_mode="columnar").parse(fetch(1)))["countries_frame"])
+
+
+def assert_same_dataset(dataset, expected):
+    pd.testing.assert_frame_equal(dataset.data, expected.data)
+    pd.testing.assert_frame_equal(dataset.continent_sums.sort_index(), expected.continent_sums.sort_index(),
+                                  check_dtype=False)
+    assert dataset.continent_rows.keys() == expected.continent_rows.keys()
+    for continent, rows in expected.continent_rows.items():
+        np.testing.assert_array_equal(dataset.continent_rows[continent], rows)
+    assert dataset.continents == expected.continents
+    assert dataset.donut_values.keys() == expected.donut_values.keys()
+    for country, values in expected.donut_values.items():
+        np.testing.assert_allclose(dataset.donut_values[country], values)
+    assert dataset.rankings.keys() == expected.rankings.keys()
+    for column, (ascending, descending) in expected.rankings.items():
+        np.testing.assert_array_equal(dataset.rankings[column][0], ascending)
+        np.testing.assert_array_equal(dataset.rankings[column][1], descending)
+
+
+def change_values(data):
+    data.loc["USA", "TotalCases"] += 1000
+    data.loc["France", "TotalDeaths"] += 10
+    data.loc["India", "ActiveCases"] = 1.0
+
+
+def change_missing_values(data):
+    data.loc["USA", "NewCases"] = np.nan
+    data.loc["India", "NewCases"] = 42.0
+    data.loc["France", "Serious,Critical"] = 7.0
+
+
+def change_continent(data):
+    data.loc["Morocco", "Continent"] = "Europe"
+    data.loc["Japan", "NewRecovered"] = 12.0
+
+
+@pytest.mark.parametrize("change", [change_values, change_missing_values, change_continent])
+def test_updated_matches_rebuild(fixture_data, change):
+    new_data = fixture_data.copy()
+    change(new_data)
+    current = CoronaDataset(fixture_data.copy())
+    dataset, delta = current.updated(new_data, base_version=1)
+
+    assert delta is not None and delta.base_version == 1
+    assert_same_dataset(dataset, CoronaDataset(new_data))
+    # The current dataset is not modified
+    assert_same_dataset(current, CoronaDataset(fixture_data))
+
+
+def test_updated_delta(fixture_data):
+    new_data = fixture_data.copy()
+    change_continent(new_data)
+    _, delta = CoronaDataset(fixture_data).updated(new_data)
+    assert delta.countries == {"Morocco", "Japan"}
+    assert delta.columns == {"Continent", "NewRecovered"}
+    assert delta.continents == {"Africa", "Europe", "Asia"}
+
+    _, delta = CoronaDataset(fixture_data).updated(fixture_data.copy())
+    assert not delta.countries and not delta.columns
+
+
+def test_updated_rebuilds_other_rows(fixture_data):
+    # A country added: the rows can not be compared, everything is rebuilt
+    new_data = pd.concat([fixture_data, fixture_data.loc[["USA"]].rename(index={"USA": "Newland"})])
+    assert diff_rows(fixture_data, new_data) is None
+    dataset, delta = CoronaDataset(fixture_data).updated(new_data)
+    assert delta is None
+    assert_same_dataset(dataset, CoronaDataset(new_data))
+
+
+class Figure:
+    """A stand-in for go.Figure, the cached dict tells which build it comes from."""
+    builds = 0
+
+    def __init__(self, name):
+        Figure.builds += 1
+        self.name = name
+
+    def to_dict(self):
+        return {"name": self.name, "build": Figure.builds}
+
+
+def cached(cache, key, version, delta=None):
+    return cache.get_or_build(key, version, lambda: Figure(key[0]), delta)
+
+
+def test_figure_cache_versions():
+    from figure_cache import FigureCache
+
+    cache = FigureCache()
+    first = cached(cache, ("k_countries_sorted", "TotalCases", 10), 1)
+    assert cached(cache, ("k_countries_sorted", "TotalCases", 10), 1) is first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # A newer version without a delta drops every entry
+    second = cached(cache, ("k_countries_sorted", "TotalCases", 10), 2)
+    assert second is not first and cache.version == 2 and len(cache) == 1
+
+    # An older version (a request started before the swap) is built but not cached, nor does it evict anything
+    old = cached(cache, ("k_countries_sorted", "TotalCases", 10), 1)
+    assert old is not second and cached(cache, ("k_countries_sorted", "TotalCases", 10), 1) is not old
+    assert cache.version == 2 and cached(cache, ("k_countries_sorted", "TotalCases", 10), 2) is second
+
+
+def test_figure_cache_carries_over_with_a_delta():
+    from dataset import Delta
+    from figure_cache import FigureCache
+    from layout import is_stale_figure
+
+    cache = FigureCache(is_stale=is_stale_figure)
+    keys = [("k_countries_sorted", "TotalCases", 10), ("k_countries_sorted", "TotalDeaths", 10),
+            ("continent_box_plot", "Deaths/1M pop"), ("gh",)]
+    figures = {key: cached(cache, key, 1) for key in keys}
+
+    delta = Delta(1, {"France"}, {"TotalDeaths"}, {"Europe"})
+    assert cached(cache, keys[0], 2, delta) is figures[keys[0]]
+    assert cached(cache, keys[1], 2, delta) is not figures[keys[1]]
+    assert cached(cache, keys[2], 2, delta) is figures[keys[2]]
+    assert cached(cache, keys[3], 2, delta) is figures[keys[3]]
+    assert cache.version == 2
+
+    # A delta from another version than the cached one can not be applied: everything is dropped
+    delta = Delta(1, {"France"}, {"NewCases"}, {"Europe"})
+    assert cached(cache, keys[0], 3, delta) is not figures[keys[0]]
+    assert len(cache) == 1
+
+
+def test_figure_cache_evicts_the_least_recently_used():
+    from figure_cache import FigureCache
+
+    cache = FigureCache(maxsize=2)
+    a = cached(cache, ("a",), 1)
+    cached(cache, ("b",), 1)
+    assert cached(cache, ("a",), 1) is a
+    cached(cache, ("c",), 1)
+    assert len(cache) == 2
+    assert cached(cache, ("a",), 1) is a
+    misses = cache.misses
+    cached(cache, ("b",), 1)
+    assert cache.misses == misses + 1
+
+
+def send(middleware, server, request):
+    """
+    Sends a request through the middleware to the fixture server, like the downloader does.
+    Returns the status the server answered and the response the middleware hands to the spider.
+    """
+    assert middleware.process_request(request) is None
+    headers = {key.decode(): values[0].decode() for key, values in request.headers.items()}
+    try:
+        with urllib.request.urlopen(urllib.request.Request(request.url, headers=headers)) as reply:
+            status, reply_headers, body = reply.status, dict(reply.headers), reply.read()
+    except urllib.error.HTTPError as error:
+        status, reply_headers, body = error.code, dict(error.headers), b""
+    response = HtmlResponse(url=request.url, status=status, headers=reply_headers, body=body, request=request)
+    return status, middleware.process_response(request, response)
+
+
+def test_conditional_fetch(tmp_path):
+    from corona_stats.middlewares import ConditionalFetchMiddleware
+
+    server = FixtureServer().start()
+    try:
+        crawler = get_crawler(settings_dict={"CONDITIONAL_FETCH_ENABLED": True, "CONDITIONAL_FETCH_DIR": str(tmp_path)})
+        middleware = ConditionalFetchMiddleware.from_crawler(crawler)
+
+        status, first = send(middleware, server, Request(server.url))
+        assert status == 200 and "not_modified" not in first.flags
+        assert first.body == server.body
+
+        # Revalidated: the server answers 304 and the cached body is handed back as a 200
+        status, second = send(middleware, server, Request(server.url))
+        assert status == 304
+        assert second.status == 200 and "not_modified" in second.flags
+        assert second.body == server.body
+
+        # The page changed: downloaded in full, and the cache now holds the new body
+        server.set_body(server.body.replace(b"Testland", b"Newland"))
+        status, third = send(middleware, server, Request(server.url))
+        assert status == 200 and "not_modified" not in third.flags and third.body == server.body
+        status, fourth = send(middleware, server, Request(server.url))
+        assert status == 304 and "not_modified" in fourth.flags and fourth.body == server.body
+
+        # dont_revalidate always downloads the page
+        status, full = send(middleware, server, Request(server.url, meta={"dont_revalidate": True}))
+        assert status == 200 and "not_modified" not in full.flags
+    finally:
+        server.shutdown()
+
+
+def test_not_modified_page_is_hashed():
+    from corona_stats.spiders.coronapagespider import CoronaPageSpider, content_hash
+
+    body = fetch(1).body
+    crawler = get_crawler()
+
+    def parse(last_content_hash):
+        spider = CoronaPageSpider.from_crawler(crawler, skip_unchanged=True, last_content_hash=last_content_hash)
+        response = HtmlResponse(url=fetch(1).url, body=body, encoding="utf-8", flags=["not_modified"])
+        return list(spider.parse(response))
+
+    # The cached page is the one of the last snapshot: skipped
+    assert parse(content_hash(body)) == [{"unchanged": "not_modified", "content_hash": content_hash(body)}]
+    # The last snapshot was built from another page: the cached page is parsed
+    items = parse("an older page")
+    assert "unchanged" not in items[0] and items[-1]["content_hash"] == content_hash(body)
+
+
+def test_country_history_item():
+    from corona_stats.spiders.countryhistoryspider import get_country_history
+    from fixture_page import build_country_page
+
+    history = get_country_history(build_country_page("France", n_days=30))
+    assert history.keys() == {"dates", "total_cases", "total_deaths", "new_cases", "new_deaths"}
+    assert len(history["dates"]) == len(history["total_cases"]) == 30
+    assert history["total_cases"][-1] == sum(history["new_cases"])
+
+
+@pytest.fixture
+def history(tmp_path):
+    from history import HistoryStore
+
+    store = HistoryStore(str(tmp_path / "history.sqlite"))
+    for scraped_at, scale in [(100.0, 1), (200.0, 2), (300.0, 3)]:
+        store.append_items([
+            {"country": "France", "continent": "Europe", "total_cases": 10 * scale, "total_deaths": scale},
+            {"country": "Spain", "continent": "Europe", "total_cases": 20 * scale, "total_deaths": None},
+            {"country": "Japan", "continent": "Asia", "total_cases": 30 * scale, "total_deaths": 2 * scale},
+        ], scraped_at)
+    yield store
+    store.close()
+
+
+def test_history_ranges(history):
+    assert history.timestamps() == [100.0, 200.0, 300.0]
+
+    france = history.country_history("France", columns=["TotalCases", "TotalDeaths"])
+    assert france["TotalCases"].tolist() == [10, 20, 30]
+    assert list(france.index) == list(pd.to_datetime([100.0, 200.0, 300.0], unit="s"))
+
+    # Both bounds are included
+    assert history.country_history("Japan", start=200.0, columns=["TotalCases"])["TotalCases"].tolist() == [60, 90]
+    assert history.country_history("Japan", end=200.0, columns=["TotalCases"])["TotalCases"].tolist() == [30, 60]
+    assert history.country_history("Japan", start=150.0, end=250.0)["TotalCases"].tolist() == [60]
+    assert history.country_history("Nowhere").empty
+
+    europe = history.continent_history("Europe", start=200.0, columns=["TotalCases", "TotalDeaths"])
+    assert europe["TotalCases"].tolist() == [60, 90]
+    # SUM skips the missing values of Spain
+    assert europe["TotalDeaths"].tolist() == [2, 3]
+
+    with pytest.raises(ValueError):
+        history.country_history("France", columns=["Continent"])
+
+
+def test_daily_history(history):
+    history.append_daily([
+        {"country": "France", "dates": ["Feb 15, 2020", "Feb 16, 2020", "Feb 17, 2020"],
+         "total_cases": [1, 3, 6], "new_cases": [1, 2, 3]},
+        {"country": "Japan", "dates": ["Feb 16, 2020"], "total_cases": [5], "new_cases": [None]},
+    ])
+    france = history.daily_history("France", start="2020-02-16")
+    assert france["TotalCases"].tolist() == [3, 6] and france["TotalDeaths"].isna().all()
+    assert list(france.index) == list(pd.to_datetime(["2020-02-16", "2020-02-17"]))
+
+    # A later crawl rewrites the days it reports again
+    history.append_daily([{"country": "France", "dates": ["Feb 17, 2020"], "total_cases": [7], "new_cases": [4]}])
+    assert history.daily_history("France", end="2020-02-17")["TotalCases"].tolist() == [1, 3, 7]
+    assert history.daily_history("Japan")["NewCases"].isna().all()
+
+
+def test_history_is_append_only(history):
+    # The same country and time are written once, a second write is ignored
+    history.append_items([{"country": "France", "continent": "Europe", "total_cases": -1}], 100.0)
+    assert history.country_history("France", end=100.0, columns=["TotalCases"])["TotalCases"].tolist() == [10]
+
+
+def test_history_delete_scrape(history):
+    history.append_items([{"country": "France", "continent": "Europe", "total_cases": 40}], 400.0)
+    history.append_items([{"country": "Spain", "continent": "Europe", "total_cases": 80}], 400.0)
+    assert history.delete_scrape(400.0) == 2
+    assert history.timestamps() == [100.0, 200.0, 300.0]
+
+
+def crawl_history(tmp_path, body):
+    """Crawls a page served by the fixture server with the history pipeline, returns the row count of every scrape."""
+    server = FixtureServer(body).start()
+    path = tmp_path / "history.sqlite"
+    try:
+        env = dict(os.environ, WORLDOMETERS_URL=server.url, HISTORY_PATH=str(path))
+        subprocess.run([sys.executable, "-m", "scrapy", "crawl", "coronapage", "-a", "parser_mode=items",
+                        "-s", "LOG_LEVEL=WARNING", "-s", "CONDITIONAL_FETCH_ENABLED=False"],
+                       cwd=ROOT, env=env, check=True, capture_output=True)
+    finally:
+        server.shutdown()
+    with closing(sqlite3.connect(path)) as connection:
+        return [count for _, count in connection.execute(
+            "SELECT scraped_at, COUNT(*) FROM country_snapshots GROUP BY scraped_at ORDER BY scraped_at")]
+
+
+def scrape_error(body, tmp_path):
+    """Scrapes a page served by the fixture server like the refresher does, returns the error raised (None if none)."""
+    server = FixtureServer(body).start()
+    script = ("from scrap import get_scraped_data\n"
+              "try:\n    get_scraped_data()\nexcept Exception as error:\n    print(type(error).__name__, error)")
+    try:
+        env = dict(os.environ, WORLDOMETERS_URL=server.url, HISTORY_PATH="", CONDITIONAL_FETCH_DIR=str(tmp_path))
+        result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, check=True,
+                                capture_output=True, text=True)
+    finally:
+        server.shutdown()
+    return result.stdout.strip() or None
+
+
+def test_scrape_errors_reach_the_caller(tmp_path):
+    from fixture_page import load_fixture
+
+    assert scrape_error(None, tmp_path / "ok") is None
+    # A renamed column: the ValueError of resolve_columns, not an error of what the crawl returned instead
+    body = load_fixture().replace(b"<th>Total<br>Cases</th>", b"<th>Cases</th>", 1)
+    assert scrape_error(body, tmp_path / "renamed").startswith(
+        "ValueError The countries table layout changed: no column found for ['total_cases']")
+
+
+def test_history_keeps_complete_scrapes(tmp_path):
+    assert crawl_history(tmp_path, None) == [230]
+
+
+def test_history_drops_failed_scrapes(tmp_path):
+    from fixture_page import load_fixture
+
+    # The countries are yielded, then the headline counters can not be found: the spider callback raises
+    body = load_fixture().replace(b'class="maincounter-number"', b'class="counter"')
+    assert crawl_history(tmp_path, body) == []
+
+
+def test_refresh_metrics_are_served():
+    from types import SimpleNamespace
+
+    from layout import load_display_data
+
+    store = SimpleNamespace(current=fixture_snapshot(), metrics={"not_modified": 2, "skipped_cpu_seconds": 0.5})
+    client = load_display_data(store, prepare_responses=False).server.test_client()
+    store.metrics["not_modified"] += 1
+    exposition = client.get("/metrics").get_data(as_text=True)
+    assert "dash_refresh_not_modified 3\n" in exposition and "dash_refresh_skipped_cpu_seconds 0.5\n" in exposition
+
+
+def test_template_asset_is_current():
+    from helpers import TEMPLATE_ASSET, template_script
+
+    # Rewritten with helpers.write_template_asset when plotly is upgraded
+    with open(TEMPLATE_ASSET) as file:
+        assert file.read() == template_script()
+
+
+def test_shared_snapshot_store(tmp_path, fixture_data):
+    from refresher import build_snapshot
+    from shared_snapshot import SharedSnapshotStore, publish_snapshot
+
+    totals = {"TotalCase": "1", "TotalDeaths": "1", "TotalRecovered": "1"}
+    store = SharedSnapshotStore(str(tmp_path), poll_interval=0)
+    # Nothing published yet: no wait
+    assert store.current is None
+
+    publish_snapshot(build_snapshot(totals, fixture_data, 1), str(tmp_path))
+    publish_snapshot(build_snapshot(totals, fixture_data, 2), str(tmp_path))
+    assert store.current.version == 2
+    assert store.current is store.current
+
+    # A restarted publisher starts again from version 1, its snapshot is served under a newer version
+    new_data = fixture_data.copy()
+    change_values(new_data)
+    publish_snapshot(build_snapshot(totals, new_data, 1), str(tmp_path))
+    assert store.current.version == 3
+    assert store.current.data.loc["USA", "TotalCases"] == new_data.loc["USA", "TotalCases"]
+
+
+def test_prepared_responses_are_measured():
+    from types import SimpleNamespace
+
+    from instrumentation import CallbackMetrics
+    from layout import load_display_data
+
+    metrics = CallbackMetrics()
+    client = load_display_data(SimpleNamespace(current=fixture_snapshot()), metrics=metrics).server.test_client()
+    inputs = [("select_box_attribute.value", "Deaths/1M pop")]
+    # The first request starts preparing the responses and goes through Dash
+    dash_response = post_callback(client, "continent_box_plot.figure", inputs)
+    for _ in range(300):
+        if "dash_prepared_responses 0\n" not in metrics.render():
+            break
+        time.sleep(0.1)
+    prepared_response = post_callback(client, "continent_box_plot.figure", inputs)
+    assert prepared_response.get_json() == dash_response.get_json()
+
+    exposition = metrics.render()
+    assert "dash_prepared_response_hits 1\n" in exposition
+    assert 'dash_callback_calls_total{callback="update_continent_box_plot"} 2\n' in exposition
+    assert 'dash_callback_duration_seconds_count{callback="update_continent_box_plot"} 2\n' in exposition
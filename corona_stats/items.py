@@ -24,3 +24,13 @@ class CoronaStatsItem(scrapy.Item):
     tests_per_million = scrapy.Field()
     population = scrapy.Field()
     continent = scrapy.Field()
+
+
+class CountryHistoryItem(scrapy.Item):
+    # The daily history of a country page (see CountryHistorySpider): the days and one value per day and field
+    country = scrapy.Field()
+    dates = scrapy.Field()
+    total_cases = scrapy.Field()
+    total_deaths = scrapy.Field()
+    new_cases = scrapy.Field()
+    new_deaths = scrapy.Field()
@@ -3,7 +3,15 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import gzip
+import hashlib
+import json
+import os
+
 from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
@@ -101,3 +109,93 @@ class CoronaStatsDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class ConditionalFetchMiddleware:
+    """
+    Downloader middleware revalidating the pages with conditional requests.
+
+    The last body of every page answered with an ETag or a Last-Modified header is kept gzipped in
+    CONDITIONAL_FETCH_DIR. The next request for that page is sent with If-None-Match/If-Modified-Since:
+    when the server answers 304 Not Modified, the cached body is handed to the spider as a 200 response
+    flagged "not_modified", so the spider can skip parsing it.
+
+    Settings:
+        CONDITIONAL_FETCH_ENABLED : enables the middleware.
+        CONDITIONAL_FETCH_DIR : where the cached bodies are kept.
+    Set request.meta["dont_revalidate"] to always download a page in full.
+    """
+
+    def __init__(self, cache_dir, stats):
+        self.cache_dir = cache_dir
+        self.stats = stats
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("CONDITIONAL_FETCH_ENABLED"):
+            raise NotConfigured
+        return cls(crawler.settings.get("CONDITIONAL_FETCH_DIR"), crawler.stats)
+
+    def _paths(self, request):
+        key = hashlib.sha1(request.url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key + ".json"), os.path.join(self.cache_dir, key + ".gz")
+
+    def _read_meta(self, request):
+        meta_path, body_path = self._paths(request)
+        if not (os.path.exists(meta_path) and os.path.exists(body_path)):
+            return None
+        with open(meta_path) as file:
+            return json.load(file)
+
+    def process_request(self, request, spider=None):
+        if request.method != "GET" or request.meta.get("dont_revalidate"):
+            return None
+        meta = self._read_meta(request)
+        if meta is None:
+            return None
+        if meta.get("etag"):
+            request.headers.setdefault(b"If-None-Match", meta["etag"])
+        if meta.get("last_modified"):
+            request.headers.setdefault(b"If-Modified-Since", meta["last_modified"])
+        return None
+
+    def process_response(self, request, response, spider=None):
+        if request.method != "GET" or request.meta.get("dont_revalidate"):
+            return response
+
+        if response.status == 304:
+            meta = self._read_meta(request)
+            if meta is None:
+                return response
+            with gzip.open(self._paths(request)[1], "rb") as file:
+                body = file.read()
+            headers = Headers({"Content-Type": meta["content_type"]}) if meta.get("content_type") else Headers()
+            response_class = responsetypes.from_args(headers=headers, url=response.url, body=body)
+            self.stats.inc_value("conditional_fetch/not_modified")
+            return response_class(url=response.url, status=200, headers=headers, body=body, request=request,
+                                  flags=response.flags + ["not_modified"])
+
+        etag = response.headers.get(b"ETag")
+        last_modified = response.headers.get(b"Last-Modified")
+        if response.status == 200 and (etag or last_modified):
+            self._store(request, response, etag, last_modified)
+            self.stats.inc_value("conditional_fetch/stored")
+        return response
+
+    def _store(self, request, response, etag, last_modified):
+        meta_path, body_path = self._paths(request)
+        content_type = response.headers.get(b"Content-Type")
+        meta = {
+            "url": response.url,
+            "etag": etag.decode("latin-1") if etag else None,
+            "last_modified": last_modified.decode("latin-1") if last_modified else None,
+            "content_type": content_type.decode("latin-1") if content_type else None,
+        }
+        # Written to temporary names then renamed: a crash never leaves a body that does not match its validators
+        with gzip.open(body_path + ".tmp", "wb") as file:
+            file.write(response.body)
+        with open(meta_path + ".tmp", "w") as file:
+            json.dump(meta, file)
+        os.replace(body_path + ".tmp", body_path)
+        os.replace(meta_path + ".tmp", meta_path)
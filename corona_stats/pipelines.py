@@ -4,10 +4,117 @@
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
 
+import logging
+import os
+import time
+
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.defer import maybe_deferred_to_future
+from twisted.internet.defer import succeed
+from twisted.internet.threads import deferToThread
+
+from corona_stats.items import CoronaStatsItem, CountryHistoryItem
+
+
+logger = logging.getLogger(__name__)
 
 
 class CoronaStatsPipeline:
-    def process_item(self, item, spider):
+    """
+    This pipeline writes the CoronaStatsItem of a crawl to the history (see history.HistoryStore),
+    and the CountryHistoryItem to the daily history of the countries.
+
+    The items are buffered as plain dicts and written by batches of HISTORY_BATCH_SIZE items while the crawl runs,
+    so the memory does not grow with the crawl. The batches are written in a thread of the reactor pool
+    (never on the reactor thread, the other crawls of the reactor keep running), one after the other,
+    each in its own short transaction: the database is not locked for the length of a crawl, the other crawls
+    write their batches in between.
+    One crawl is one scrape of the history (its rows share their scraped_at). When a spider callback raised
+    (Scrapy does not fail the crawl for it) or a batch could not be written, the rows of the crawl are deleted
+    when the spider closes: the history only keeps the scrapes parsed in full. The daily history of the country
+    pages parsed is kept, every page is a history of its own. Other items pass through untouched.
+
+    Settings:
+        HISTORY_PATH : the SQLite database of the history, the pipeline is disabled when it is not set.
+        HISTORY_BATCH_SIZE : the number of items written at once (50 by default).
+    """
+
+    def __init__(self, history_path, stats, batch_size=50):
+        self.history_path = history_path
+        self.stats = stats
+        self.batch_size = batch_size
+        self.rows = []
+        self.daily_items = []
+        self.scraped_at = None
+        self.failed = False
+        self._history = None
+        self._writes = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.get("HISTORY_PATH"):
+            raise NotConfigured
+        pipeline = cls(crawler.settings.get("HISTORY_PATH"), crawler.stats,
+                       crawler.settings.getint("HISTORY_BATCH_SIZE", 50))
+        crawler.signals.connect(pipeline.spider_error, signal=signals.spider_error)
+        return pipeline
+
+    def open_spider(self, spider=None):
+        self.rows = []
+        self.daily_items = []
+        self.scraped_at = time.time()
+        self.failed = False
+        self._history = None
+        self._writes = succeed(None)
+
+    def spider_error(self, failure, response, spider):
+        # The items yielded before the error went through, the page was not parsed in full
+        self.failed = True
+
+    def process_item(self, item, spider=None):
+        if isinstance(item, CoronaStatsItem):
+            self.rows.append(ItemAdapter(item).asdict())
+        elif isinstance(item, CountryHistoryItem):
+            self.daily_items.append(ItemAdapter(item).asdict())
+        if len(self.rows) + len(self.daily_items) >= self.batch_size:
+            self._flush()
         return item
+
+    def _flush(self):
+        rows, daily_items = self.rows, self.daily_items
+        self.rows, self.daily_items = [], []
+        # Chained: the batches are written in order, and none after a failed one
+        self._writes.addCallback(lambda _: deferToThread(self._write, rows, daily_items))
+
+    def _write(self, rows, daily_items):
+        if self._history is None and (rows or daily_items):
+            # Imported here: history.py lives next to the dashboard, at the root of the repository
+            from history import HistoryStore
+
+            os.makedirs(os.path.dirname(self.history_path) or ".", exist_ok=True)
+            self._history = HistoryStore(self.history_path)
+        if rows:
+            self.stats.inc_value("history/rows_written", self._history.append_items(rows, self.scraped_at))
+        if daily_items:
+            self.stats.inc_value("history/days_written", self._history.append_daily(daily_items))
+
+    async def close_spider(self, spider=None):
+        self._flush()
+        try:
+            await maybe_deferred_to_future(self._writes)
+        except Exception as error:
+            logger.error("Writing the history failed: %s", error)
+            self.failed = True
+        if self._history is None:
+            return
+        try:
+            if self.failed:
+                deleted = await maybe_deferred_to_future(deferToThread(self._history.delete_scrape, self.scraped_at))
+                self.stats.set_value("history/rows_deleted", deleted)
+                logger.warning("The crawl did not complete, the %d history rows it wrote are deleted", deleted)
+        finally:
+            self._history.close()
+            self._history = None
@@ -0,0 +1,33 @@
+# Schema of the countries dataset.
+#
+# Every CoronaStatsItem field (see items.py) is mapped to the column name used on the
+# worldometers table (and by the dashboard) and to the dtype of that column once cleaned.
+# This module does not import scrapy, so the dashboard can use it without the scraper.
+
+# The country is not a column: it is the index of the dataset.
+INDEX_FIELD = "country"
+
+# (item field, column name, dtype)
+# "int64" columns fall back to float64 when a value is missing, int64 can not hold NaN.
+COLUMNS = [
+    ("total_cases", "TotalCases", "int64"),
+    ("new_cases", "NewCases", "int64"),
+    ("total_deaths", "TotalDeaths", "int64"),
+    ("new_deaths", "NewDeaths", "int64"),
+    ("total_recovered", "TotalRecovered", "int64"),
+    ("new_recovered", "NewRecovered", "int64"),
+    ("active_cases", "ActiveCases", "int64"),
+    ("serious_critical", "Serious,Critical", "int64"),
+    ("total_cases_per_million", "Tot\xa0Cases/1M pop", "float64"),
+    ("deaths_per_million", "Deaths/1M pop", "float64"),
+    ("total_tests", "TotalTests", "int64"),
+    ("tests_per_million", "Tests/1Mpop", "float64"),
+    ("population", "Population", "int64"),
+    ("continent", "Continent", "category"),
+]
+
+FIELD_TO_COLUMN = {field: column for field, column, _ in COLUMNS}
+COLUMN_TO_FIELD = {column: field for field, column, _ in COLUMNS}
+FIELD_DTYPES = {field: dtype for field, _, dtype in COLUMNS}
+COLUMN_DTYPES = {column: dtype for _, column, dtype in COLUMNS}
+NUMERIC_COLUMNS = [column for _, column, dtype in COLUMNS if dtype != "category"]
@@ -7,6 +7,8 @@
 #     https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
 #     https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import os
+
 BOT_NAME = "corona_stats"
 
 SPIDER_MODULES = ["corona_stats.spiders"]
@@ -50,9 +52,18 @@ ROBOTSTXT_OBEY = True
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
+DOWNLOADER_MIDDLEWARES = {
 #    "corona_stats.middlewares.CoronaStatsDownloaderMiddleware": 543,
-#}
+    # Before HttpCompressionMiddleware (590) on the way back, so the cached bodies are decompressed
+    "corona_stats.middlewares.ConditionalFetchMiddleware": 585,
+}
+
+# Revalidate the pages with ETag/Last-Modified, keeping their last body gzipped on disk
+CONDITIONAL_FETCH_ENABLED = True
+CONDITIONAL_FETCH_DIR = os.environ.get(
+    "CONDITIONAL_FETCH_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "http_cache"),
+)
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
@@ -62,9 +73,18 @@ ROBOTSTXT_OBEY = True
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-#ITEM_PIPELINES = {
-#    "corona_stats.pipelines.CoronaStatsPipeline": 300,
-#}
+ITEM_PIPELINES = {
+    "corona_stats.pipelines.CoronaStatsPipeline": 300,
+}
+
+# The SQLite history every scrape is appended to by CoronaStatsPipeline (same default as app.py)
+HISTORY_PATH = os.environ.get(
+    "HISTORY_PATH",
+    os.path.join(
+        os.environ.get("SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")),
+        "history.sqlite3",
+    ),
+)
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
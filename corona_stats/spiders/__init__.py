@@ -2,3 +2,8 @@
 #
 # Please refer to the documentation for information on how to create and manage
 # your spiders.
+
+import os
+
+# The page scraped by the spiders, the WORLDOMETERS_URL environment variable points them to a local copy.
+WORLDOMETERS_URL = os.environ.get("WORLDOMETERS_URL", "https://www.worldometers.info/coronavirus")
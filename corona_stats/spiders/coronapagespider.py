@@ -0,0 +1,72 @@
+import hashlib
+import re
+import time
+
+from corona_stats.spiders.coronaspider import CoronaSpiderSpider
+from corona_stats.spiders.totalStatscoronapider import TotalstatscoronapiderSpider
+
+
+# The raw markup the dashboard data comes from, found without parsing the page
+COUNTRIES_TABLE_RE = re.compile(rb'<table[^>]*id="main_table_countries_today".*?</table>', re.DOTALL)
+MAINCOUNTER_RE = re.compile(rb'<div[^>]*class="maincounter-number"[^>]*>.*?</div>', re.DOTALL)
+
+
+def content_hash(body):
+    """
+    This function hashes the parts of the page the data is extracted from: the countries table and the
+    headline counters. The rest of the page (ads, timestamps, news...) changes on every download and is ignored.
+
+    Parameters:
+        body : bytes
+            The raw page.
+    Returns:
+        digest : str or None
+            The hex digest, None when the countries table is not found (the parser will report why).
+    """
+    table = COUNTRIES_TABLE_RE.search(body)
+    if table is None:
+        return None
+    digest = hashlib.blake2b(table.group(), digest_size=16)
+    for counter in MAINCOUNTER_RE.finditer(body):
+        digest.update(counter.group())
+    return digest.hexdigest()
+
+
+class CoronaPageSpider(CoronaSpiderSpider):
+    """
+    This spider downloads the worldometers page once and yields both the headline counters
+    and the per-country records from the same parsed tree.
+
+    The items are always yielded in the same order: first the countries data (streamed one item per country
+    with parser_mode="items"), then the totals. The totals also carry the content_hash of the page
+    and parse_cpu, the CPU seconds spent parsing it (the time of the reactor thread, where the parse runs:
+    the other threads of the process are not counted).
+
+    With skip_unchanged, a page whose content_hash is last_content_hash is not parsed: a single {"unchanged": reason}
+    item is yielded instead, reason being "not_modified" when the server reported it as not modified
+    (see ConditionalFetchMiddleware) or "same_content". A page reported as not modified is still hashed:
+    the cached body may not be the page the last snapshot was built from (a failed refresh, a cold start
+    from an older snapshot), and it is then parsed.
+    """
+    name = "coronapage"
+
+    skip_unchanged = False
+    last_content_hash = None
+
+    def parse(self, response):
+        started = time.thread_time()
+        page_hash = content_hash(response.body)
+        if self.skip_unchanged and page_hash is not None and page_hash == self.last_content_hash:
+            if "not_modified" in response.flags:
+                yield {"unchanged": "not_modified", "content_hash": page_hash}
+                return
+            self.crawler.stats.inc_value("content_hash/unchanged")
+            yield {"unchanged": "same_content", "content_hash": page_hash}
+            return
+
+        # response.xpath reuses the selector built on the first call, so the html is only parsed once
+        yield from super().parse(response)
+        total_stats = TotalstatscoronapiderSpider.get_total_stats(response)
+        total_stats["content_hash"] = page_hash
+        total_stats["parse_cpu"] = time.thread_time() - started
+        yield total_stats
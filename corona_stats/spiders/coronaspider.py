@@ -1,88 +1,163 @@
+from urllib.parse import urlparse
+
 import scrapy
-from collections import defaultdict
+import numpy as np
+import pandas as pd
+from lxml import etree
+
+from corona_stats.items import CoronaStatsItem
+from corona_stats.schema import COLUMNS, FIELD_DTYPES, INDEX_FIELD
+from corona_stats.spiders import WORLDOMETERS_URL
+
+
+# The <th> text of every schema field without its whitespace (<br>, &nbsp;...): "Tot&nbsp;Cases/<br>1M pop" is
+# "TotCases/1Mpop", the schema column names are the headers of the table.
+HEADER_FIELDS = {"".join(column.split()): field for field, column, _ in COLUMNS}
+HEADER_FIELDS["Country,Other"] = INDEX_FIELD
+
+
+def resolve_columns(headers):
+    """
+    This function maps the headers of the countries table to the schema fields.
+
+    Parameters:
+        headers : list
+            The <th> texts, in the order of the table.
+    Returns:
+        plan : dict
+            The position of the cell of every field in a row, {field: index}, the country included.
+    Raises:
+        ValueError : when a field has no column or two of them. The layout of the table changed and the cells
+            can not be trusted to hold what they used to.
+    """
+    plan = {}
+    for index, header in enumerate(headers):
+        field = HEADER_FIELDS.get("".join(header.split()))
+        if field is None:
+            continue
+        if field in plan:
+            raise ValueError(f"The countries table layout changed: two columns are headed {header.strip()!r}")
+        plan[field] = index
+    missing = [field for field in [INDEX_FIELD] + [field for field, _, _ in COLUMNS] if field not in plan]
+    if missing:
+        raise ValueError(f"The countries table layout changed: no column found for {missing}, "
+                         f"the headers are {[' '.join(header.split()) for header in headers]}")
+    return plan
+
+
+def table_columns(corona_table):
+    """
+    This function reads the <th> of the countries table once and returns the cell position of every field
+    (see resolve_columns).
+
+    Parameters:
+        corona_table : SelectorList
+            The main_table_countries_today table.
+    """
+    headers = [''.join(th.xpath('.//text()').getall()) for th in corona_table.xpath('.//tr/th')]
+    return resolve_columns(headers)
+
+
+def parse_cell(text, dtype):
+    """
+    This function converts the text of a table cell to the type of its schema field.
+
+    Parameters:
+        text : str
+            The stripped cell text, e.g. "+1,234", "N/A" or "".
+        dtype : str
+            The dtype of the field in corona_stats.schema.
+    Returns:
+        value : int, float, str or None
+            None when the cell is empty or not a number.
+    """
+    if dtype == "category":
+        return text if text not in ("", "N/A") else None
+    text = text.replace("+", "").replace(",", "").strip()
+    try:
+        return int(text) if dtype == "int64" else float(text)
+    except ValueError:
+        try:
+            return float(text)
+        except ValueError:
+            return None
 
 
 class CoronaSpiderSpider(scrapy.Spider):
     name = "coronaspider"
-    allowed_domains = ["www.worldometers.info"]
-    start_urls = ["https://www.worldometers.info/coronavirus"]
+    allowed_domains = [urlparse(WORLDOMETERS_URL).hostname]
+    start_urls = [WORLDOMETERS_URL]
+
+    # "items" yields one CoronaStatsItem per country, "columnar" yields {"countries_frame": DataFrame}.
+    # Both find the cells from the headers of the table (see resolve_columns).
+    # It can be set from the command line: scrapy crawl coronaspider -a parser_mode=columnar
+    parser_mode = "items"
 
     def parse(self, response):
-        # Selecting the table where the data is contained using XPath
-        corona_table = response.xpath('//table[@id="main_table_countries_today"]')
+        if self.parser_mode == "columnar":
+            yield {"countries_frame": self.parse_columnar(response)}
+        elif self.parser_mode == "items":
+            yield from self.parse_items(response)
+        else:
+            raise ValueError(f"Unknown parser_mode {self.parser_mode!r}, expected 'items' or 'columnar'")
 
-        # Extracting the column headers
-        column_headers = corona_table.xpath('.//tr/th')
-
-        hs = ""
-        # Printing each content of <th> on a single line
-        for header in column_headers:
-            # Extracting all text content within <th> and concatenating them into one line
-            header_text = ''.join(header.xpath('.//text()').getall())
-            hs +=  header_text.strip() + '\n'
-            
-        # print(self.get_column_names(hs))
-        column_names = self.get_column_names(hs)
-        
-        # Extracting rows respecting specified column grouping
-        # print(corona_table.xpath('.//tr[@style=""]')[0].get())
-                
-        countries_data = defaultdict(dict)
-        
-        # print(formatted_output)
-        
-        for tr in corona_table.xpath('.//tr[@style=""]'):
-            td_elements = tr.xpath('.//td')
-            td_contents = [td.xpath('string()').get().strip() for td in td_elements]
-            td = '\n'.join(td_contents)
-            line = self.get_country_data(td)
-            # print(line)
-            
-            countries_data[line[0]] = dict(zip(column_names, line[1:]))
-            
-            # print(countries_data)
-
-        yield countries_data
-    
-    def get_column_names(self, tr):
+    def parse_columnar(self, response):
         """
-        This function return a well formatted list for the column names.
+        This function parses the whole countries table in one lxml pass into column arrays,
+        then converts the numeric columns in bulk.
+
+        Parameters:
+            response : HtmlResponse
+                The downloaded worldometers page.
+        Returns:
+            data : dataframe
+                One row per country (the index), a float64 column per numeric schema column
+                and an object "Continent" column.
         """
-        line = tr.strip("\n#").strip().split("\n")
-        line[12] += line[13]
-        line[12] = ''.join(line[12].split())
-        line[16] = line[16] + line[17] + line[18]
-        line.pop(13)
-        line.pop(16)
-        line.pop(16)
-        return line[1:-1]
-    
-    def get_country_data(self, country_line):
+        corona_table = response.xpath('//table[@id="main_table_countries_today"]')
+        plan = table_columns(corona_table)
+
+        table = corona_table[0].root
+        rows = table.xpath('.//tr[@style=""]')
+        n_cells = {len(row.findall('td')) for row in rows}
+        if len(n_cells) != 1:
+            raise ValueError(f"The countries table rows do not have the same number of cells: {sorted(n_cells)}")
+        cells = [etree.tostring(td, method='text', encoding='unicode', with_tail=False).strip()
+                 for td in table.xpath('.//tr[@style=""]/td')]
+        grid = np.array(cells, dtype=object).reshape(len(rows), -1)
+
+        # Converting every numeric cell at once: strip the "+" and "," then coerce "", "N/A"... to NaN
+        numeric = [(field, column) for field, column, dtype in COLUMNS if dtype != "category"]
+        numeric_cells = grid[:, [plan[field] for field, _ in numeric]]
+        numbers = pd.to_numeric(pd.Series(numeric_cells.ravel()).str.replace(r"[+,\s]", "", regex=True), errors="coerce")
+
+        data = pd.DataFrame(numbers.to_numpy(dtype=float).reshape(numeric_cells.shape),
+                            index=pd.Index(grid[:, plan[INDEX_FIELD]]), columns=[column for _, column in numeric])
+        for field, column, dtype in COLUMNS:
+            if dtype == "category":
+                data[column] = grid[:, plan[field]]
+        return data
+
+    def parse_items(self, response):
         """
-        This function formats a given input line parsed from an html page.
+        This function yields one typed CoronaStatsItem per country, as soon as its row is parsed.
 
-        Parameters:
-            country_line : str
-                it is a row table row, that contains the data.
+        Numbers are int (float for the per million fields), the continent a str, missing values are None.
 
-        Returns:
-            line : list
-                A list containing all the useful information retrieved.
+        Parameters:
+            response : HtmlResponse
+                The downloaded worldometers page.
         """
-        import re
-        line = country_line.strip().split("\n")
-        line.pop(0)
-        
-        line[15] = line[15] + line[16] + line[17]
-        line.pop(16)
-        line.pop(16)
-        
-        for i, element in zip(range(len(line)), line):
-            if re.search("[1-9]+", element):
-                line[i] = float(''.join(line[i].strip('+').split(",")))
-            else:
-                pass
-
-        return line[:-1]
-                
-        
+        corona_table = response.xpath('//table[@id="main_table_countries_today"]')
+        plan = table_columns(corona_table)
+        n_cells = max(plan.values()) + 1
+
+        for row in corona_table[0].root.xpath('.//tr[@style=""]'):
+            cells = [etree.tostring(td, method='text', encoding='unicode', with_tail=False).strip()
+                     for td in row.findall('td')]
+            if len(cells) < n_cells:
+                raise ValueError(f"A row of the countries table has {len(cells)} cells, {n_cells} are expected")
+            item = CoronaStatsItem({INDEX_FIELD: cells[plan[INDEX_FIELD]]})
+            for field, dtype in FIELD_DTYPES.items():
+                item[field] = parse_cell(cells[plan[field]], dtype)
+            yield item
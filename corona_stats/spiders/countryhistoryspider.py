@@ -0,0 +1,104 @@
+import json
+import re
+import time
+from urllib.parse import urljoin, urlparse
+
+import scrapy
+
+from corona_stats.items import CountryHistoryItem
+from corona_stats.schema import INDEX_FIELD
+from corona_stats.spiders import WORLDOMETERS_URL
+from corona_stats.spiders.coronaspider import table_columns
+
+
+# The Highcharts charts of a country page and the CountryHistoryItem field their first series is stored in
+CHART_FIELDS = {
+    "coronavirus-cases-linear": "total_cases",
+    "coronavirus-deaths-linear": "total_deaths",
+    "graph-cases-daily": "new_cases",
+    "graph-deaths-daily": "new_deaths",
+}
+CHART_RE = re.compile(r"Highcharts\.chart\('([\w-]+)'.*?categories:\s*(\[.*?\]).*?data:\s*(\[.*?\])", re.DOTALL)
+
+
+def get_country_history(page):
+    """
+    This function extracts the daily history of a country from the Highcharts scripts of its page.
+
+    Parameters:
+        page : str
+            The country page.
+    Returns:
+        history : dict
+            "dates" (the chart categories, e.g. "Feb 15, 2020") and one list of values per field of CHART_FIELDS
+            found in the page (None for the days without a value).
+    """
+    history = {}
+    for chart, categories, data in CHART_RE.findall(page):
+        if chart in CHART_FIELDS:
+            history.setdefault("dates", json.loads(categories))
+            history[CHART_FIELDS[chart]] = json.loads(data)
+    return history
+
+
+class CountryHistorySpider(scrapy.Spider):
+    """
+    This spider fans out from the main table to the page of every country (/coronavirus/country/<name>/)
+    and yields one CountryHistoryItem per country as soon as its page is parsed,
+    CoronaStatsPipeline writes them to the daily history.
+
+    The country pages are fetched concurrently, AutoThrottle adapts the delay to the latency of the server.
+    Besides the usual Scrapy stats, the crawl reports under country_pages/: the number of pages, their download
+    latency (mean, max) and the throughput of the fan-out (pages per second).
+    """
+    name = "countryhistory"
+    allowed_domains = [urlparse(WORLDOMETERS_URL).hostname]
+    start_urls = [WORLDOMETERS_URL]
+
+    custom_settings = {
+        "CONCURRENT_REQUESTS": 32,
+        "CONCURRENT_REQUESTS_PER_DOMAIN": 8,
+        # Without a delay, the downloader starts every queued request of a slot at once (it only counts a transfer
+        # once its coroutine runs) and CONCURRENT_REQUESTS_PER_DOMAIN is not enforced, a 1ms delay is enough
+        "DOWNLOAD_DELAY": 0.001,
+        "AUTOTHROTTLE_ENABLED": True,
+        "AUTOTHROTTLE_START_DELAY": 0.5,
+        "AUTOTHROTTLE_MAX_DELAY": 10,
+        # Average number of requests in flight, AutoThrottle never goes past CONCURRENT_REQUESTS_PER_DOMAIN
+        "AUTOTHROTTLE_TARGET_CONCURRENCY": 4.0,
+    }
+
+    # Only the first `limit` countries of the table are fetched when set: scrapy crawl countryhistory -a limit=10
+    limit = None
+
+    def parse(self, response):
+        # The links are relative to the /coronavirus/ directory
+        base_url = response.url.rstrip("/") + "/"
+        corona_table = response.xpath('//table[@id="main_table_countries_today"]')
+        country_cell = table_columns(corona_table)[INDEX_FIELD] + 1
+        links = corona_table.xpath(f'.//tr[@style=""]/td[{country_cell}]/a[@class="mt_a"]')
+        if self.limit is not None:
+            links = links[:int(self.limit)]
+
+        self.crawler.stats.set_value("country_pages/discovered", len(links))
+        self._fanout_started = time.perf_counter()
+        for link in links:
+            yield scrapy.Request(urljoin(base_url, link.attrib["href"]), callback=self.parse_country,
+                                 cb_kwargs={"country": link.xpath("string()").get().strip()})
+
+    def parse_country(self, response, country):
+        stats = self.crawler.stats
+        latency = response.meta.get("download_latency", 0.0)
+        stats.inc_value("country_pages/count")
+        stats.inc_value("country_pages/latency_total", latency, start=0.0)
+        stats.max_value("country_pages/latency_max", latency)
+        yield CountryHistoryItem(country=country, **get_country_history(response.text))
+
+    def closed(self, reason):
+        stats = self.crawler.stats
+        pages = stats.get_value("country_pages/count", 0)
+        if not pages:
+            return
+        elapsed = time.perf_counter() - self._fanout_started
+        stats.set_value("country_pages/latency_mean", stats.get_value("country_pages/latency_total") / pages)
+        stats.set_value("country_pages/per_second", pages / elapsed)
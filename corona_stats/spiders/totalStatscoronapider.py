@@ -1,16 +1,28 @@
+from urllib.parse import urlparse
+
 import scrapy
 
+from corona_stats.spiders import WORLDOMETERS_URL
+
 class TotalstatscoronapiderSpider(scrapy.Spider):
     name = "totalStatscoronapider"
-    allowed_domains = ["www.worldometers.info"]
-    start_urls = ["https://www.worldometers.info/coronavirus"]
+    allowed_domains = [urlparse(WORLDOMETERS_URL).hostname]
+    start_urls = [WORLDOMETERS_URL]
 
     def parse(self, response):
+        yield self.get_total_stats(response)
+
+    @staticmethod
+    def get_total_stats(response):
+        """
+        This function extracts the headline counters (cases, deaths, recovered) from the page.
+        """
         countries_data = dict()
-        
-        totalCases = response.xpath('//div[@class="maincounter-number"]/span/text()')[0].extract()
-        totalDeaths = response.xpath('//div[@class="maincounter-number"]/span/text()')[1].extract()
-        totalRecovered = response.xpath('//div[@class="maincounter-number"]/span/text()')[2].extract()
+
+        counters = response.xpath('//div[@class="maincounter-number"]/span/text()')
+        totalCases = counters[0].extract()
+        totalDeaths = counters[1].extract()
+        totalRecovered = counters[2].extract()
         
         # print(totalCases)
 
@@ -18,4 +30,4 @@ class TotalstatscoronapiderSpider(scrapy.Spider):
         countries_data["TotalDeaths"] = totalDeaths
         countries_data["TotalRecovered"] = totalRecovered
         
-        yield countries_data
\ No newline at end of file
+        return countries_data
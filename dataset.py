@@ -0,0 +1,207 @@
+import copy
+from collections import namedtuple
+
+import numpy as np
+
+
+# The columns summed per continent, used by plot_continent_data ("New" and "Total" keywords)
+CONTINENT_SUM_COLUMNS = ["NewCases", "NewRecovered", "NewDeaths", "TotalCases", "TotalRecovered", "TotalDeaths"]
+
+# The columns of the "select_attribute" dropdown, each of them gets a ranking index
+SORTABLE_COLUMNS = [
+    "TotalCases", "NewCases", "Tot\xa0Cases/1M pop", "ActiveCases", "Serious,Critical", "TotalDeaths",
+    "NewDeaths", "Deaths/1M pop", "TotalRecovered", "NewRecovered", "TotalTests", "Tests/1Mpop",
+]
+
+# The columns the donut percentages are computed from
+DONUT_COLUMNS = ["ActiveCases", "TotalRecovered", "TotalDeaths", "TotalCases"]
+
+# What changed between two versions of the dataset: the countries whose rows changed,
+# the columns with at least one changed value and the continents of the changed countries (before and after).
+Delta = namedtuple("Delta", ["base_version", "countries", "columns", "continents"])
+
+# Everything the dashboard needs to render, built once per scrape and never modified afterwards.
+# The figures are not part of it, the callbacks build them on demand (see layout.load_display_data).
+# `data` is the cleaned dataframe, `dataset` the CoronaDataset (aggregates, indexes) built on it,
+# `delta` what changed since the previous snapshot (None when it was built from scratch),
+# `content_hash` the hash of the page it was parsed from (see corona_stats.spiders.coronapagespider.content_hash),
+# `client_data` what the clientside callbacks draw from (see helpers.client_data).
+Snapshot = namedtuple("Snapshot", ["version", "created_at", "data", "dataset", "totals", "delta", "content_hash",
+                                   "client_data"])
+
+
+def is_affected(delta, columns, country=None):
+    """
+    This function tells if something computed from some columns (and only from the row of `country`,
+    when given) must be recomputed after a delta.
+    """
+    if not delta.columns & set(columns):
+        return False
+    return country is None or country in delta.countries
+
+
+def diff_rows(old, new):
+    """
+    This function compares two versions of the cleaned dataset, missing values being equal to each other.
+
+    Parameters:
+        old, new : dataframe
+            The current and the new dataset.
+    Returns:
+        changed : tuple or None
+            (changed row positions in old, changed columns), None when the rows or the columns are not the same
+            (countries added or removed, dtypes changed...) and the datasets can not be compared row by row.
+    """
+    if len(old) != len(new) or not old.index.sort_values().equals(new.index.sort_values()):
+        return None
+    if list(old.columns) != list(new.columns) or not old.dtypes.equals(new.dtypes):
+        return None
+    new = new.reindex(old.index)
+
+    changed = np.zeros((len(old), len(old.columns)), dtype=bool)
+    for i, column in enumerate(old.columns):
+        if column == "Continent":
+            before, after = old[column].astype(object).to_numpy(), new[column].astype(object).to_numpy()
+            changed[:, i] = (before != after) & ~(old[column].isna().to_numpy() & new[column].isna().to_numpy())
+        else:
+            before, after = old[column].to_numpy(dtype=float), new[column].to_numpy(dtype=float)
+            changed[:, i] = (before != after) & ~(np.isnan(before) & np.isnan(after))
+    rows = np.flatnonzero(changed.any(axis=1))
+    columns = [column for column, column_changed in zip(old.columns, changed.any(axis=0)) if column_changed]
+    return rows, columns
+
+
+class CoronaDataset:
+    """
+    This class wraps the cleaned countries dataframe of a snapshot with the structures derived from it.
+
+    Everything is computed once when the snapshot is built, the callbacks only read it:
+        continent_sums : dataframe
+            The sum of the New* and Total* columns per continent (continents as index, sorted by name).
+        continent_rows : dict
+            The row positions (np.ndarray) of the countries of each continent.
+        continents : list
+            The continents ordered by number of countries, most countries first.
+        donut_values : dict
+            For every country, its (active, recovered, deaths) shares of TotalCases in percent, 0 when unknown.
+        rankings : dict
+            For every sortable column, the row positions sorted by ascending and by descending value
+            (stable np.argsort, missing values last): {column: (ascending_rows, descending_rows)}.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self._build_continents()
+        self.donut_values = {}
+        self._build_donut_values(np.arange(len(data)))
+        self.rankings = {}
+        self._build_rankings(SORTABLE_COLUMNS)
+
+    def __len__(self):
+        return len(self.data)
+
+    def _build_continents(self):
+        grouped = self.data.groupby("Continent", observed=True)
+        self.continent_sums = grouped[CONTINENT_SUM_COLUMNS].sum()
+        self.continent_rows = {continent: np.asarray(rows) for continent, rows in grouped.indices.items()}
+        self.continents = sorted(self.continent_rows, key=lambda continent: -len(self.continent_rows[continent]))
+
+    def _build_donut_values(self, rows):
+        subset = self.data.iloc[rows]
+        percents = subset[DONUT_COLUMNS[:3]].to_numpy(dtype=float)
+        percents = np.nan_to_num(percents / subset["TotalCases"].to_numpy(dtype=float)[:, None] * 100)
+        self.donut_values.update(zip(subset.index, map(tuple, percents.tolist())))
+
+    def _build_rankings(self, columns):
+        for column in columns:
+            if column in SORTABLE_COLUMNS and column in self.data.columns:
+                values = self.data[column].to_numpy(dtype=float)
+                self.rankings[column] = (np.argsort(values, kind="stable"), np.argsort(-values, kind="stable"))
+
+    def updated(self, new_data, base_version=None):
+        """
+        This function applies a new scrape to the dataset, only rewriting what depends on the changed rows.
+
+        The changed rows are written into a copy of the current dataframe (the row order is kept, so the row positions
+        stay valid), then only the sums of the affected continents, the rankings of the changed columns and the donut
+        values of the changed countries are recomputed. When the countries or the columns differ, everything is rebuilt.
+
+        Parameters:
+            new_data : dataframe
+                The new cleaned dataset.
+            base_version : int, Default=None
+                The version of the snapshot holding this dataset, stored in the delta.
+        Returns:
+            dataset : CoronaDataset
+                The updated dataset (this one is not modified).
+            delta : Delta or None
+                What changed, None when everything was rebuilt.
+        """
+        changed = diff_rows(self.data, new_data)
+        if changed is None:
+            return CoronaDataset(new_data), None
+        rows, columns = changed
+
+        dataset = copy.copy(self)
+        countries = self.data.index[rows]
+        continents = set(self.data["Continent"].iloc[rows].dropna()) | set(new_data.loc[countries, "Continent"].dropna())
+        delta = Delta(base_version, set(countries), set(columns), continents)
+        if not len(rows):
+            return dataset, delta
+
+        dataset.data = self.data.copy()
+        for column in columns:
+            dataset.data.iloc[rows, dataset.data.columns.get_loc(column)] = new_data.loc[countries, column].to_numpy()
+
+        if "Continent" in columns:
+            dataset._build_continents()
+        elif set(columns) & set(CONTINENT_SUM_COLUMNS):
+            dataset.continent_sums = self.continent_sums.copy()
+            for continent in continents:
+                dataset.continent_sums.loc[continent] = dataset.continent_data(continent, CONTINENT_SUM_COLUMNS).sum()
+
+        if set(columns) & set(DONUT_COLUMNS):
+            dataset.donut_values = dict(self.donut_values)
+            dataset._build_donut_values(rows)
+
+        dataset.rankings = dict(self.rankings)
+        dataset._build_rankings(columns)
+        return dataset, delta
+
+    def continent_data(self, continent, columns=None):
+        """
+        This function returns the rows of a continent without grouping the whole dataset again.
+
+        Parameters:
+            continent : str
+                The continent we want to get the data from.
+            columns : list or str, Default=None
+                The columns to keep, all of them when None.
+        Returns:
+            data : dataframe or series
+                The countries of the continent.
+        """
+        rows = self.continent_rows[continent]
+        if columns is None:
+            return self.data.iloc[rows]
+        return self.data[columns].iloc[rows]
+
+    def top_k_rows(self, column, k=10, ascending=False):
+        """
+        This function returns the row positions of the k countries with the highest (or lowest) values of a column.
+
+        It slices the ranking index, without sorting the dataset. Like sort_values, missing values come last.
+
+        Parameters:
+            column : str
+                One of SORTABLE_COLUMNS.
+            k : int, Default=10
+                The number of countries, all of them when None.
+            ascending : Boolean, Default=False
+                Either we want the lowest values first or the highest values first.
+        Returns:
+            rows : np.ndarray
+                The row positions, in the wanted order.
+        """
+        ascending_rows, descending_rows = self.rankings[column]
+        return (ascending_rows if ascending else descending_rows)[:k]
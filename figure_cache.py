@@ -0,0 +1,221 @@
+import gzip
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, request
+
+from instrumentation import phase
+
+
+class FigureCache:
+    """
+    This class memoizes the figures returned by the Dash callbacks.
+
+    Entries are keyed on the callback inputs and belong to a dataset version: the first lookup with a newer
+    version drops every entry of the previous one, lookups with an older version are built but never cached.
+    When the newer version comes with the delta from the cached version and the cache has an `is_stale(key, delta)`
+    function, only the entries it reports as stale are dropped.
+    The least recently used entry is evicted past `maxsize`.
+    Figures are stored as plain dicts (fig.to_dict()), Dash sends them as they are without re-validating them.
+    """
+
+    def __init__(self, maxsize=256, is_stale=None):
+        self.maxsize = maxsize
+        self.is_stale = is_stale
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_build(self, key, version, build, delta=None):
+        """
+        This function returns the cached figure for key, building it on a miss.
+
+        Parameters:
+            key : tuple
+                The callback name followed by its inputs, it must be hashable.
+            version : int
+                The version of the snapshot the figure is built from.
+            build : callable
+                Called without arguments on a miss, it returns the go.Figure to cache.
+            delta : Delta, Default=None
+                What changed since the previous version (see CoronaDataset.updated).
+        Returns:
+            figure : dict
+                The figure as a dict.
+        """
+        with self._lock:
+            if self.version is None or version > self.version:
+                if delta is not None and self.is_stale is not None and delta.base_version == self.version:
+                    self._carry_over(version, delta)
+                else:
+                    self._invalidate(version)
+            figure = self._entries.get(key) if version == self.version else None
+            if figure is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return figure
+            self.misses += 1
+
+        # Building outside of the lock, other callbacks are not blocked by a slow figure
+        with phase("build"):
+            figure = build()
+        figure = figure.to_dict()
+
+        with self._lock:
+            if version == self.version:
+                self._entries[key] = figure
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return figure
+
+    def invalidate(self, version=None):
+        """This function drops every cached figure, the next lookups must use `version`."""
+        with self._lock:
+            self._invalidate(version)
+
+    def _carry_over(self, version, delta):
+        for key in [key for key in self._entries if self.is_stale(key, delta)]:
+            del self._entries[key]
+        self.version = version
+
+    def _invalidate(self, version):
+        self._entries.clear()
+        self.version = version
+
+
+def encode_response(output, figure):
+    """
+    This function serializes the Dash response of a callback returning a figure, with orjson (needs orjson).
+
+    Parameters:
+        output : str
+            The output of the callback, "<component id>.<property>".
+        figure : dict
+            The figure (see FigureCache.get_or_build), numpy arrays are written as JSON arrays and NaN as null.
+    Returns:
+        body : bytes
+            The response, as Dash would send it.
+    """
+    import orjson
+
+    component, prop = output.split(".")
+    return orjson.dumps({"multi": True, "response": {component: {prop: figure}}},
+                        option=orjson.OPT_SERIALIZE_NUMPY, default=_to_list)
+
+
+def _to_list(value):
+    # Arrays orjson does not write natively (non contiguous, object dtype...)
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def compress_response(body):
+    """This function returns a response body in every encoding it can be sent with: {encoding: bytes}."""
+    encoded = {"identity": body, "gzip": gzip.compress(body, compresslevel=9)}
+    try:
+        import brotli
+    except ImportError:
+        return encoded
+    encoded["br"] = brotli.compress(body, quality=11)
+    return encoded
+
+
+class PreparedResponses:
+    """
+    This class answers the callback requests of every known input combination with responses prepared once per snapshot.
+
+    `figures(snapshot)` yields (output, inputs, figure) for every combination. Each response is serialized once
+    (encode_response) and compressed once at the highest levels (compress_response), the requests are then answered
+    from a Flask before_request hook without running the callback, encoding or compressing anything.
+    Requests with other inputs go through Dash as usual. The responses of a snapshot are prepared in a background
+    thread started by the first request seeing it, the requests go through Dash until they are ready.
+    """
+
+    def __init__(self, figures):
+        self.figures = figures
+        self.hits = 0
+        self.prepare_seconds = 0.0
+        self._prepared = (None, {})
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._prepared[1])
+
+    def prepare(self, snapshot):
+        """This function prepares the responses of a snapshot, they replace the ones of the previous snapshot."""
+        start = time.perf_counter()
+        responses = {}
+        for output, inputs, figure in self.figures(snapshot):
+            responses[(output, *inputs)] = compress_response(encode_response(output, figure))
+        self._prepared = (snapshot.version, responses)
+        self.prepare_seconds += time.perf_counter() - start
+
+    def _prepare_locked(self, snapshot):
+        try:
+            if self._prepared[0] is None or snapshot.version > self._prepared[0]:
+                self.prepare(snapshot)
+        finally:
+            self._lock.release()
+
+    def lookup(self, snapshot, output, inputs):
+        """
+        This function returns the prepared response of a request, None when it must go through Dash.
+
+        Returns:
+            response : dict or None
+                The response body in every encoding (see compress_response).
+        """
+        version, responses = self._prepared
+        if (version is None or snapshot.version > version) and self._lock.acquire(blocking=False):
+            # Prepared off the request path, the requests go through Dash until it is done
+            threading.Thread(target=self._prepare_locked, args=(snapshot,), name="prepare-responses", daemon=True).start()
+        if snapshot.version != version:
+            return None
+        try:
+            return responses.get((output, *inputs))
+        except TypeError:
+            # Unhashable inputs (lists...) are never prepared
+            return None
+
+    def install(self, app, store, metrics=None):
+        """
+        This function answers the callback requests of a Dash app with the prepared responses of `store.current`.
+
+        It must be called after the callbacks are registered. The responses served are recorded in `metrics`
+        (a CallbackMetrics) under the name of the callback they answer for, like the calls of the callback.
+        """
+        path = app.config.routes_pathname_prefix + "_dash-update-component"
+        names = {output: callback["callback"].__name__ for output, callback in app.callback_map.items()
+                 if "callback" in callback}
+
+        @app.server.before_request
+        def _answer_prepared():
+            if request.method != "POST" or request.path != path:
+                return None
+            start = time.perf_counter()
+            body = request.get_json(silent=True)
+            if not isinstance(body, dict) or not isinstance(body.get("inputs"), list):
+                return None
+            inputs = [item.get("value") for item in body["inputs"] if isinstance(item, dict)]
+            encoded = self.lookup(store.current, body.get("output"), inputs)
+            if encoded is None:
+                return None
+            encoding = next((encoding for encoding in ("br", "gzip")
+                             if encoding in encoded and request.accept_encodings[encoding] > 0), "identity")
+            response = Response(encoded[encoding], mimetype="application/json")
+            if encoding != "identity":
+                # Already compressed, flask-compress leaves it as it is
+                response.headers["Content-Encoding"] = encoding
+            response.vary.add("Accept-Encoding")
+            self.hits += 1
+            if metrics is not None and body.get("output") in names:
+                metrics.record(names[body["output"]], time.perf_counter() - start, len(encoded["identity"]))
+            return response
@@ -0,0 +1,30 @@
+# The gunicorn settings of the production serving mode (see wsgi.py):
+#     gunicorn -c gunicorn.conf.py wsgi:server
+import multiprocessing
+import os
+import subprocess
+import sys
+
+bind = os.environ.get("BIND", "0.0.0.0:8096")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# The app is imported once in the master, the workers share its modules (copy-on-write) instead of importing them.
+# No snapshot is attached before the fork, nor any thread started: the workers answer 503 until the publisher
+# published the first snapshot, then the first request of a worker attaches it and builds its aggregates.
+preload_app = True
+timeout = 120
+
+# The publisher crawls and publishes the snapshots for every worker, set START_PUBLISHER=0 when it runs elsewhere
+_publisher = None
+
+
+def on_starting(server):
+    global _publisher
+    if os.environ.get("START_PUBLISHER", "1") == "1":
+        app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+        _publisher = subprocess.Popen([sys.executable, app_path, "publish"])
+
+
+def on_exit(server):
+    if _publisher is not None:
+        _publisher.terminate()
+        _publisher.wait()
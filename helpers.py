@@ -1,44 +1,79 @@
+import os
+
 import plotly.graph_objs as go
 import pandas as pd
 import numpy as np
-import plotly.express as px
+import plotly.io as pio
 
+from corona_stats.schema import COLUMN_DTYPES
+from instrumentation import phase
 
-def replace_nan(data):
-    """
-    This function replaces empty or N/A values with np.nan so that it can be easier to manipulate the data later on.
-    """
-    for col in data.columns:
-        data[col].replace(["N/A", "", " "], np.nan, inplace=True)
+
+# The columns drawn by plot_continent_data for each keyword
+CONTINENT_KEYWORD_COLUMNS = {
+    "New": ["NewCases", "NewRecovered", "NewDeaths"],
+    "Total": ["TotalCases", "TotalRecovered", "TotalDeaths"],
+}
+# The colors of the bars of plot_continent_data, in the order of the columns
+CONTINENT_BAR_COLORS = ["#101e70", "#186e3c", "#cc1b35"]
+
+# The plotly template of the server figures as a static asset, the clientside figures (assets/dashboard.js) use it
+TEMPLATE_ASSET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "plotly_template.js")
+
+# Scatters with more points than this are drawn with WebGL (Scattergl) instead of SVG
+WEBGL_THRESHOLD = int(os.environ.get("WEBGL_THRESHOLD", 1000))
+# When set, scatters with more points are downsampled to this many points before being sent to the browser
+SCATTER_MAX_POINTS = int(os.environ["SCATTER_MAX_POINTS"]) if os.environ.get("SCATTER_MAX_POINTS") else None
 
 
 def create_clean_dataframe(countries_data):
     """
     This function takes a dict object and create a clean well formatted dataframe.
 
+    The columns are the ones of corona_stats.schema: numeric columns are int64 (float64 when a value is missing)
+    or float64, "Continent" is categorical and the countries are the index. "", "N/A"... become NaN.
+
     Parameters:
-        countries_data : dict object
-            The dict that contains the countries data.
+        countries_data : dict object or dataframe
+            The dict that contains the countries data, or the dataframe already built by the columnar parser.
     Returns:
         data : dataframe
             Well formatted dataframe.
     """
-    data = pd.DataFrame(countries_data).transpose()
-    replace_nan(data)
+    if isinstance(countries_data, pd.DataFrame):
+        raw = countries_data
+    else:
+        raw = pd.DataFrame.from_dict(countries_data, orient="index")
+
+    data = pd.DataFrame(index=raw.index.astype(str))
+    for column, dtype in COLUMN_DTYPES.items():
+        values = raw[column] if column in raw.columns else pd.Series(np.nan, index=raw.index)
+        if dtype == "category":
+            data[column] = pd.Categorical(values.replace(["N/A", "", " "], np.nan))
+            continue
+        values = pd.to_numeric(values, errors="coerce")
+        if dtype == "int64" and values.isna().any():
+            dtype = "float64"
+        data[column] = values.astype(dtype).to_numpy()
     return data
 
 
+def memory_footprint(data):
+    """This function returns the memory used by a dataframe in bytes, python objects included."""
+    return int(data.memory_usage(deep=True).sum())
+
+
 """Building the plotting functions"""
 
 # ---------------------------------------------------------------------------
 
-def plot_continent_data(data, keyword):
+def plot_continent_data(dataset, keyword):
     """
     This function creates a Figure from continental data.
 
     Parameters:
-        data : dataframe
-            The whole dataset.
+        dataset : CoronaDataset
+            The whole dataset, with its precomputed continent sums.
         keyword : str
             The keyword used to define the figure wanted, the available keyword : {"Total", "New"}
 
@@ -46,15 +81,12 @@ def plot_continent_data(data, keyword):
         fig : Figure
             The figure that will be drawed on plotly.
     """
-    if keyword == "New":
-        cols = ["NewCases", "NewRecovered", "NewDeaths"]
-    else:
-        cols = ["TotalCases", "TotalRecovered", "TotalDeaths"]
-    res = data.groupby("Continent")[cols].sum()
+    cols = CONTINENT_KEYWORD_COLUMNS["New" if keyword == "New" else "Total"]
+    with phase("pandas"):
+        res = dataset.continent_sums[cols]
 
     plot_data = []
-    colors = ["#101e70", "#186e3c", "#cc1b35"]
-    for col, color in zip(cols, colors):
+    for col, color in zip(cols, CONTINENT_BAR_COLORS):
         plot_data.append(go.Bar(x=res.index.to_list(), y=res[col], name=col, marker=dict(color=color)))
 
     layout = go.Layout(title=f"Corona {keyword} Cases/Recovered/Deaths",
@@ -66,13 +98,13 @@ def plot_continent_data(data, keyword):
     return fig
 
 
-def get_continent_sorted_data(data, continent, sortedby="TotalCases", ascending=False):
+def get_continent_sorted_data(dataset, continent, sortedby="TotalCases", ascending=False):
     """
     This function creates a sorted dataframe related to a continent and sorted by a columns.
 
     Parameters:
-        data : dataframe
-            The whole dataset.
+        dataset : CoronaDataset
+            The whole dataset, with its precomputed continent rows.
         continent : str
             The continent we want to get the data from.
         sortedby : str, Default="TotalCases"
@@ -83,16 +115,16 @@ def get_continent_sorted_data(data, continent, sortedby="TotalCases", ascending=
         groupedbydata : dataframe
             A dataframe groupedby the continent.
     """
-    return data.groupby("Continent").get_group(continent).sort_values(by=sortedby, ascending=ascending).reset_index()
+    return dataset.continent_data(continent).sort_values(by=sortedby, ascending=ascending).reset_index()
 
 
-def get_top_k_countries(data, k_countries=10, sortedby="TotalCases", ascending=False):
+def get_top_k_countries(dataset, k_countries=10, sortedby="TotalCases", ascending=False):
     """
     This function creates a k-len dataframe sorted by a key.
 
     Parameters:
-        data : dataframe.
-            The whole dataset.
+        dataset : CoronaDataset
+            The whole dataset, with its precomputed ranking indexes.
         k_countries : int, Default=10
             The number of countries you want to plot.
         sortedby : str, Default="TotalCases".
@@ -104,12 +136,13 @@ def get_top_k_countries(data, k_countries=10, sortedby="TotalCases", ascending=F
         data : dataframe
             The k_contries lines dataframe sortedby the key given and in the wanted order.
     """
-    return data.sort_values(by=sortedby, ascending=ascending).iloc[:k_countries]
+    return dataset.data.iloc[dataset.top_k_rows(sortedby, k_countries, ascending)]
 
 
-def plot_top_k_countries(data, n_countries, sortby):
+def plot_top_k_countries(dataset, n_countries, sortby):
     """This function returns a figure where a number of countries are sorted by the value that resides in sortby."""
-    res = get_top_k_countries(data, n_countries, sortby)
+    with phase("pandas"):
+        res = get_top_k_countries(dataset, n_countries, sortby)
     plot_data = []
 
     plot_data.append(go.Bar(x=res.index.to_list(), y=res[sortby], name=sortby))
@@ -122,13 +155,14 @@ def plot_top_k_countries(data, n_countries, sortby):
     return fig
 
 
-def plot_boxplots(data, keyword="Deaths/1M pop"):
+def plot_boxplots(dataset, keyword="Deaths/1M pop"):
     """This function returns a figure of the boxplot related to each continent in regards to the keyword."""
+    with phase("pandas"):
+        values = dataset.data[keyword].to_numpy()
+        values = [values[dataset.continent_rows[continent]] for continent in dataset.continents]
     plot_data = []
-    grouped_data = data.groupby("Continent")
-    continents = data["Continent"].value_counts().index.to_list()
-    for continent in continents:
-        plot_data.append(go.Box(y=grouped_data.get_group(continent)[keyword], name=continent))
+    for continent, continent_values in zip(dataset.continents, values):
+        plot_data.append(go.Box(y=continent_values, name=continent))
     layout = go.Layout(title=f"Boxplots using {keyword}",
                        xaxis=dict(title="Continents"),
                        yaxis=dict(title=f"{keyword}"))
@@ -136,50 +170,114 @@ def plot_boxplots(data, keyword="Deaths/1M pop"):
     return fig
 
 
-def plot_scatter(data):
+def downsample_points(data, max_points=None):
+    """
+    This function keeps at most max_points rows of a dataset drawn as a scatter.
+
+    The rows are sampled with a fixed seed, so the same dataset always gives the same figure.
+    """
+    if max_points is None or len(data) <= max_points:
+        return data
+    return data.sample(n=max_points, random_state=0)
+
+
+def plot_scatter(data, webgl_threshold=WEBGL_THRESHOLD, max_points=SCATTER_MAX_POINTS):
     """This function returns a figure of the scatter of TotalCases and TotalDeaths related to each country in regards to the keyword."""
+    # plotly.express is imported on first use, it costs as much as the rest of plotly to import
+    import plotly.express as px
+
+    data = downsample_points(data, max_points)
     fig = px.scatter(
         data, x="TotalCases", y="TotalDeaths",
         size="Population", color="Continent", hover_name=data.index,
-        log_x=True, size_max=60
+        log_x=True, size_max=60,
+        render_mode="webgl" if len(data) > webgl_threshold else "svg"
     )
     return fig
 
-def plot_dount(data):
-    # Calculate percentages for each category
-    data['ActiveCasesPercent'] = data['ActiveCases'] / data['TotalCases'] * 100
-    data['RecoveredPercent'] = data['TotalRecovered'] / data['TotalCases'] * 100
-    data['DeathsPercent'] = data['TotalDeaths'] / data['TotalCases'] * 100
-
-    # Fill missing values with 0
-    data.fillna(0, inplace=True)
-
-    # Create the donut graph
-    init_dount_fig = go.Figure()
-
-    for index, row in data.iterrows():
-        init_dount_fig.add_trace(go.Pie(
-            labels=['Active Cases', 'Recovered', 'Deaths'],
-            values=[row['ActiveCasesPercent'], row['RecoveredPercent'], row['DeathsPercent']],
-            hole=0.3,
-            name=index
-        ))
-
-    init_dount_fig.update_layout(
-        title="COVID-19 Distribution by Country",
-        annotations=[dict(text=c, x=0.5, y=0.5, font_size=20, showarrow=False) for c in data.index],
-        # height=600,
-        # width=800
+def plot_dount(dataset, country="USA"):
+    """
+    This function returns the donut of a single country: its active cases, recovered and deaths shares.
+
+    Parameters:
+        dataset : CoronaDataset
+            The whole dataset, with its precomputed per-country percentages.
+        country : str, Default="USA"
+            The country to draw, the first country of the dataset is used when it is missing.
+    """
+    if country not in dataset.donut_values:
+        country = next(iter(dataset.donut_values), country)
+    active, recovered, deaths = dataset.donut_values.get(country, (0, 0, 0))
+
+    fig = go.Figure(go.Pie(
+        labels=['Active Cases', 'Recovered', 'Deaths'],
+        values=[active, recovered, deaths],
+        hole=0.3
+    ))
+
+    fig.update_layout(
+        title=f"COVID-19 Distribution for {country}",
+        # height=500,
+        # width=700
     )
-    return init_dount_fig
+    return fig
 
 
-def idk(data):
-    for col in ['TotalRecovered', 'ActiveCases', 'Serious,Critical']:
-        data[col] = pd.to_numeric(data[col], errors='coerce')
+def client_data(dataset):
+    """
+    This function returns the data the clientside callbacks (see assets/dashboard.js) draw their figures from.
+
+    It holds what plot_continent_data and plot_dount read, so switching the keyword or the country of the donut
+    needs no request to the server. The blob is built once per snapshot and stored in the page (dcc.Store).
+
+    Parameters:
+        dataset : CoronaDataset
+            The whole dataset, with its precomputed continent sums and per-country percentages.
+    Returns:
+        blob : dict
+            continents : the continents, sorted by name.
+            continent_sums : the sum of every column of CONTINENT_KEYWORD_COLUMNS, per continent.
+            keyword_columns, bar_colors : CONTINENT_KEYWORD_COLUMNS and CONTINENT_BAR_COLORS.
+            donut : the (active, recovered, deaths) percents of every country, rounded to 2 decimals.
+        The plotly template does not change with the snapshot, it is a static asset (see template_script).
+    """
+    sums = dataset.continent_sums
+    return {
+        "continents": sums.index.to_list(),
+        "continent_sums": {column: sums[column].to_list() for column in sums.columns},
+        "keyword_columns": CONTINENT_KEYWORD_COLUMNS,
+        "bar_colors": CONTINENT_BAR_COLORS,
+        "donut": {country: [round(value, 2) for value in values] for country, values in dataset.donut_values.items()},
+    }
+
+
+def template_script():
+    """
+    This function returns the content of TEMPLATE_ASSET: the default plotly template, the server figures are drawn
+    with, as window.dashboardTemplate. The asset is served (and cached by the browser) like the other assets.
+    It must be rewritten when plotly is upgraded:
+        python -c "import helpers; helpers.write_template_asset()"
+    """
+    # Imported here: plotly.io.json loads plotly.offline (and IPython when installed), the app only needs it here
+    from plotly.io.json import to_json_plotly
+
+    template = to_json_plotly(pio.templates[pio.templates.default].to_plotly_json())
+    return ("// Generated by helpers.write_template_asset: the plotly template of the server figures\n"
+            f"window.dashboardTemplate = {template};\n")
+
+
+def write_template_asset():
+    """This function (re)writes TEMPLATE_ASSET from the plotly template installed."""
+    with open(TEMPLATE_ASSET, "w") as file:
+        file.write(template_script())
+
+
+def idk(data, webgl_threshold=WEBGL_THRESHOLD, max_points=SCATTER_MAX_POINTS):
+    data = downsample_points(data, max_points)
+    scatter = go.Scattergl if len(data) > webgl_threshold else go.Scatter
 
     # Create the scatter plot
-    fig = go.Figure(data=go.Scatter(
+    fig = go.Figure(data=scatter(
         x=data['TotalCases'],
         y=data['Deaths/1M pop'],
         text=data.index, 
@@ -199,10 +297,6 @@ def idk(data):
     )
     return fig
 
-def init_figure(data):
-    "This function initiate all the needed figure to start the app."
-    return plot_scatter(data), plot_continent_data(data, keyword="Total"), plot_top_k_countries(data, 10, "TotalCases"), plot_boxplots(data), plot_dount(data), idk(data)
-
 
 def getTotals(data):
     total_deaths = data['TotalDeaths'].sum()
@@ -0,0 +1,205 @@
+import datetime
+import sqlite3
+import threading
+
+import pandas as pd
+
+from corona_stats.schema import COLUMNS, COLUMN_TO_FIELD, FIELD_TO_COLUMN, INDEX_FIELD
+
+
+# The numeric fields stored for every country row, named after the CoronaStatsItem fields
+NUMERIC_FIELDS = [field for field, _, dtype in COLUMNS if dtype != "category"]
+# The fields of the daily history of a country page (see CountryHistoryItem)
+DAILY_FIELDS = ["total_cases", "total_deaths", "new_cases", "new_deaths"]
+
+
+class HistoryStore:
+    """
+    This class is an append-only history of the scraped countries, stored in SQLite.
+
+    Every scrape appends one row per country with its timestamp (seconds since the epoch), rows are never updated.
+    The timestamp identifies the scrape: the rows of a scrape that failed are dropped with delete_scrape.
+    The table is clustered on (country, scraped_at), so the history of a country is a single range read,
+    and a covering index on (continent, scraped_at) answers the continent queries without touching the table.
+    The daily history of the country pages is kept in its own table, one row per country and day: a day is
+    rewritten when a later crawl reports other values for it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        numeric = ", ".join(f"{field} REAL" for field in NUMERIC_FIELDS)
+        with self._connection:
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS country_snapshots ("
+                f"{INDEX_FIELD} TEXT NOT NULL, scraped_at REAL NOT NULL, continent TEXT, {numeric}, "
+                f"PRIMARY KEY ({INDEX_FIELD}, scraped_at)) WITHOUT ROWID"
+            )
+            self._connection.execute(
+                f"CREATE INDEX IF NOT EXISTS continent_history ON country_snapshots "
+                f"(continent, scraped_at, {', '.join(NUMERIC_FIELDS)})"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS scrape_times ON country_snapshots (scraped_at)")
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS country_daily ("
+                f"{INDEX_FIELD} TEXT NOT NULL, day TEXT NOT NULL, {', '.join(f'{field} REAL' for field in DAILY_FIELDS)}, "
+                f"PRIMARY KEY ({INDEX_FIELD}, day)) WITHOUT ROWID"
+            )
+
+    def close(self):
+        """This function closes the database connection."""
+        self._connection.close()
+
+    def append_items(self, items, scraped_at):
+        """
+        This function appends the CoronaStatsItem of a scrape to the history, in a single transaction.
+        The items of a scrape can be appended by several batches, one transaction each.
+
+        Parameters:
+            items : list
+                The items (or dicts with the same fields), a missing field is stored as NULL.
+            scraped_at : float
+                The time of the scrape, in seconds since the epoch.
+        Returns:
+            n_rows : int
+                The number of rows written.
+        """
+        rows = [(str(item[INDEX_FIELD]), scraped_at, item.get("continent"), *(item.get(field) for field in NUMERIC_FIELDS))
+                for item in items]
+        placeholders = ", ".join("?" * (3 + len(NUMERIC_FIELDS)))
+        self._write(f"INSERT OR IGNORE INTO country_snapshots "
+                    f"({INDEX_FIELD}, scraped_at, continent, {', '.join(NUMERIC_FIELDS)}) VALUES ({placeholders})",
+                    rows)
+        return len(rows)
+
+    def append_daily(self, items):
+        """
+        This function writes the daily history of some countries, in a single transaction.
+
+        Parameters:
+            items : list
+                The CountryHistoryItem (or dicts with the same fields): the days ("Feb 15, 2020") and the values
+                of every day, a missing field is stored as NULL.
+        Returns:
+            n_rows : int
+                The number of days written.
+        """
+        rows = []
+        for item in items:
+            days = [datetime.datetime.strptime(date, "%b %d, %Y").date().isoformat() for date in item.get("dates") or []]
+            series = [item.get(field) or [None] * len(days) for field in DAILY_FIELDS]
+            rows.extend((str(item[INDEX_FIELD]), day, *values) for day, *values in zip(days, *series))
+        placeholders = ", ".join("?" * (2 + len(DAILY_FIELDS)))
+        self._write(f"INSERT OR REPLACE INTO country_daily ({INDEX_FIELD}, day, {', '.join(DAILY_FIELDS)}) "
+                    f"VALUES ({placeholders})", rows)
+        return len(rows)
+
+    def _write(self, statement, rows):
+        # One short transaction per call: the write lock of the database is never held between two batches
+        with self._lock, self._connection:
+            self._connection.executemany(statement, rows)
+
+    def delete_scrape(self, scraped_at):
+        """
+        This function drops the rows of a scrape (a crawl that failed after some of its batches were written).
+
+        Returns:
+            n_rows : int
+                The number of rows deleted.
+        """
+        with self._lock, self._connection:
+            return self._connection.execute("DELETE FROM country_snapshots WHERE scraped_at = ?", (scraped_at,)).rowcount
+
+    def daily_history(self, country, start=None, end=None):
+        """
+        This function returns the daily history of a country, as crawled from its page.
+
+        Parameters:
+            country : str
+                The country, as in the dataset index.
+            start, end : str, Default=None
+                The days range (ISO dates, both included), unbounded when None.
+        Returns:
+            history : dataframe
+                One row per day, indexed by the day (datetime), with the TotalCases, TotalDeaths, NewCases
+                and NewDeaths columns.
+        """
+        query = f"SELECT day, {', '.join(DAILY_FIELDS)} FROM country_daily WHERE {INDEX_FIELD} = ?"
+        params = [country]
+        if start is not None:
+            query += " AND day >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND day <= ?"
+            params.append(end)
+        with self._lock:
+            rows = self._connection.execute(query + " ORDER BY day", params).fetchall()
+        history = pd.DataFrame(rows, columns=["day"] + [FIELD_TO_COLUMN[field] for field in DAILY_FIELDS])
+        history.index = pd.to_datetime(history.pop("day"))
+        return history
+
+    def timestamps(self):
+        """This function returns the times of every scrape stored, oldest first."""
+        with self._lock:
+            cursor = self._connection.execute("SELECT DISTINCT scraped_at FROM country_snapshots ORDER BY scraped_at")
+            return [row[0] for row in cursor]
+
+    def country_history(self, country, start=None, end=None, columns=None):
+        """
+        This function returns the history of a country.
+
+        Parameters:
+            country : str
+                The country, as in the dataset index.
+            start, end : float, Default=None
+                The time range (seconds since the epoch, both included), unbounded when None.
+            columns : list, Default=None
+                The dataset columns wanted (e.g. ["TotalCases"]), every numeric column when None.
+        Returns:
+            history : dataframe
+                One row per scrape, indexed by the scrape time (datetime).
+        """
+        fields = self._fields(columns)
+        query = f"SELECT scraped_at, {', '.join(fields)} FROM country_snapshots WHERE {INDEX_FIELD} = ?"
+        return self._read(query, [country], fields, start, end)
+
+    def continent_history(self, continent, start=None, end=None, columns=None):
+        """
+        This function returns the history of a continent: the sum of its countries at every scrape.
+
+        The parameters and the returned dataframe are the same as country_history, with a continent instead of a country.
+        """
+        fields = self._fields(columns)
+        sums = ", ".join(f"SUM({field})" for field in fields)
+        query = f"SELECT scraped_at, {sums} FROM country_snapshots WHERE continent = ?"
+        return self._read(query, [continent], fields, start, end, group_by="scraped_at")
+
+    def _fields(self, columns):
+        if columns is None:
+            return NUMERIC_FIELDS
+        fields = [COLUMN_TO_FIELD[column] for column in columns]
+        if not set(fields) <= set(NUMERIC_FIELDS):
+            raise ValueError(f"Only numeric columns have a history, got {columns}")
+        return fields
+
+    def _read(self, query, params, fields, start, end, group_by=None):
+        if start is not None:
+            query += " AND scraped_at >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND scraped_at <= ?"
+            params.append(end)
+        if group_by is not None:
+            query += f" GROUP BY {group_by}"
+        query += " ORDER BY scraped_at"
+
+        with self._lock:
+            rows = self._connection.execute(query, params).fetchall()
+        history = pd.DataFrame(rows, columns=["scraped_at"] + [FIELD_TO_COLUMN[field] for field in fields])
+        history.index = pd.to_datetime(history.pop("scraped_at"), unit="s")
+        return history
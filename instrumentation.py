@@ -0,0 +1,179 @@
+import cProfile
+import heapq
+import io
+import logging
+import pstats
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+
+# The upper bounds (seconds) of the callback duration histogram
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+
+# The phases a callback call is split in:
+#   pandas : reading the dataset, inside the plot functions of helpers.py
+#   plotly : building the go.Figure (FigureCache builds minus the pandas time)
+#   serialize : everything else, mostly fig.to_dict and the validation and JSON encoding of the response by Dash
+PHASES = ["pandas", "plotly", "serialize"]
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+@contextmanager
+def phase(name):
+    """
+    This function times a block of code as a phase of the callback call running on this thread.
+
+    Outside of an instrumented callback (e.g. when preparing the responses) it only runs the block.
+    """
+    phases = getattr(_local, "phases", None)
+    if phases is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] += time.perf_counter() - start
+
+
+class CallbackMetrics:
+    """
+    This class records the cost of every Dash callback call and exposes it in the Prometheus text format.
+
+    Per callback it keeps the number of calls and errors, a histogram of the wall time, the time spent in every phase
+    (see PHASES) and the size of the JSON responses. The responses served without running the callback
+    (figure_cache.PreparedResponses) are recorded under its name with `record`. Gauges (e.g. the figure cache hits) can be added to the exposition
+    as functions returning a number.
+    When `profile_slowest` is above 0, every call runs under cProfile and the profile of a call is logged
+    when it is one of the `profile_slowest` slowest calls seen so far (the profiler slows every call, debug only).
+    """
+
+    def __init__(self, profile_slowest=0):
+        self.profile_slowest = profile_slowest
+        self.gauges = {}
+        self._calls = defaultdict(int)
+        self._errors = defaultdict(int)
+        self._buckets = defaultdict(lambda: [0] * len(DURATION_BUCKETS))
+        self._seconds = defaultdict(float)
+        self._phase_seconds = defaultdict(float)
+        self._bytes = defaultdict(int)
+        self._max_bytes = defaultdict(int)
+        self._slowest = []
+        self._lock = threading.Lock()
+
+    def install(self, app, path="/metrics"):
+        """
+        This function instruments every callback registered on a Dash app and serves the metrics on its Flask server.
+
+        It must be called after the callbacks are registered. The clientside callbacks never reach the server.
+        """
+        for callback in app.callback_map.values():
+            if "callback" in callback:
+                callback["callback"] = self.instrument(callback["callback"])
+        app.server.add_url_rule(path, "metrics", self._serve)
+
+    def instrument(self, func):
+        """This function wraps a Dash callback (as stored in app.callback_map, it returns the JSON response)."""
+        name = func.__name__
+
+        @wraps(func)
+        def instrumented(*args, **kwargs):
+            _local.phases = phases = defaultdict(float)
+            profiler = cProfile.Profile() if self.profile_slowest > 0 else None
+            start = time.perf_counter()
+            try:
+                if profiler is not None:
+                    response = profiler.runcall(func, *args, **kwargs)
+                else:
+                    response = func(*args, **kwargs)
+            except Exception:
+                with self._lock:
+                    self._errors[name] += 1
+                raise
+            finally:
+                wall = time.perf_counter() - start
+                _local.phases = None
+            size = len(response.encode("utf-8")) if isinstance(response, str) else len(response or b"")
+            self.record(name, wall, size, phases)
+            if profiler is not None:
+                self._keep_profile(name, wall, profiler)
+            return response
+
+        return instrumented
+
+    def record(self, name, wall, size, phases=None):
+        """
+        This function records a call of a callback: its wall time (seconds), the size of its JSON response
+        and the time of its phases, all of it is serialize time when not given.
+        """
+        phases = phases if phases is not None else defaultdict(float)
+        pandas = phases["pandas"]
+        plotly = max(phases["build"] - pandas, 0.0)
+        with self._lock:
+            self._calls[name] += 1
+            self._seconds[name] += wall
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if wall <= bound:
+                    self._buckets[name][i] += 1
+            self._phase_seconds[name, "pandas"] += pandas
+            self._phase_seconds[name, "plotly"] += plotly
+            self._phase_seconds[name, "serialize"] += max(wall - pandas - plotly, 0.0)
+            self._bytes[name] += size
+            self._max_bytes[name] = max(self._max_bytes[name], size)
+
+    def _keep_profile(self, name, wall, profiler):
+        with self._lock:
+            if len(self._slowest) >= self.profile_slowest and wall <= self._slowest[0]:
+                return
+            heapq.heappush(self._slowest, wall)
+            if len(self._slowest) > self.profile_slowest:
+                heapq.heappop(self._slowest)
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(25)
+        logger.info("Callback %s took %.1fms, one of the %d slowest calls:\n%s",
+                    name, wall * 1000, self.profile_slowest, output.getvalue())
+
+    def render(self):
+        """This function returns the metrics in the Prometheus text exposition format."""
+        with self._lock:
+            names = sorted(self._calls)
+            lines = [
+                "# HELP dash_callback_calls_total Callback calls.",
+                "# TYPE dash_callback_calls_total counter",
+                *(f'dash_callback_calls_total{{callback="{name}"}} {self._calls[name]}' for name in names),
+                "# HELP dash_callback_errors_total Callback calls that raised.",
+                "# TYPE dash_callback_errors_total counter",
+                *(f'dash_callback_errors_total{{callback="{name}"}} {count}' for name, count in sorted(self._errors.items())),
+                "# HELP dash_callback_duration_seconds Wall time of the callback calls, JSON encoding included.",
+                "# TYPE dash_callback_duration_seconds histogram",
+            ]
+            for name in names:
+                for bound, count in zip(DURATION_BUCKETS, self._buckets[name]):
+                    lines.append(f'dash_callback_duration_seconds_bucket{{callback="{name}",le="{bound}"}} {count}')
+                lines.append(f'dash_callback_duration_seconds_bucket{{callback="{name}",le="+Inf"}} {self._calls[name]}')
+                lines.append(f'dash_callback_duration_seconds_sum{{callback="{name}"}} {self._seconds[name]:.6f}')
+                lines.append(f'dash_callback_duration_seconds_count{{callback="{name}"}} {self._calls[name]}')
+            lines += [
+                "# HELP dash_callback_phase_seconds_total Time of the callback calls spent in each phase.",
+                "# TYPE dash_callback_phase_seconds_total counter",
+                *(f'dash_callback_phase_seconds_total{{callback="{name}",phase="{phase_name}"}} '
+                  f'{self._phase_seconds[name, phase_name]:.6f}' for name in names for phase_name in PHASES),
+                "# HELP dash_callback_response_bytes_total Size of the JSON responses.",
+                "# TYPE dash_callback_response_bytes_total counter",
+                *(f'dash_callback_response_bytes_total{{callback="{name}"}} {self._bytes[name]}' for name in names),
+                "# HELP dash_callback_response_bytes_max Size of the largest JSON response.",
+                "# TYPE dash_callback_response_bytes_max gauge",
+                *(f'dash_callback_response_bytes_max{{callback="{name}"}} {self._max_bytes[name]}' for name in names),
+            ]
+        for name, value in self.gauges.items():
+            lines += [f"# TYPE {name} gauge", f"{name} {value()}"]
+        return "\n".join(lines) + "\n"
+
+    def _serve(self):
+        return self.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
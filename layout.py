@@ -1,22 +1,59 @@
-import plotly.graph_objs as go
 import dash
-import dash_core_components as dcc
-import dash_html_components as html
-from dash.dependencies import Input, Output
+from dash import ClientsideFunction, Input, Output, State, dcc, html
 from theme import theme
 import dash_bootstrap_components as dbc
-from helpers import plot_continent_data, plot_top_k_countries, plot_boxplots
+from helpers import idk, plot_boxplots, plot_scatter, plot_top_k_countries
+from dataset import is_affected
+from flask_compress import Compress
+from figure_cache import FigureCache, PreparedResponses
+from instrumentation import CallbackMetrics
 
 
+# The options of the dropdowns of the server callbacks, the response of every combination is prepared
+# once per snapshot (see load_display_data)
+ATTRIBUTE_OPTIONS = [
+    dict(label="Total Cases", value='TotalCases'),
+    dict(label="New Cases", value='NewCases'),
+    dict(label="Total Cases per 1M population", value='Tot\xa0Cases/1M pop'),
+    dict(label="Active Cases", value='ActiveCases'),
+    dict(label="Serious, Critical Cases", value='Serious,Critical'),
+    dict(label="Total Deaths", value='TotalDeaths'),
+    dict(label="New Deaths", value='NewDeaths'),
+    dict(label="Deaths per 1M population", value='Deaths/1M pop'),
+    dict(label="Total Recovered", value='TotalRecovered'),
+    dict(label="New Recovered", value='NewRecovered'),
+    dict(label="Total Tests", value='TotalTests'),
+    dict(label="Tests per 1M population", value='Tests/1Mpop')
+]
+K_COUNTRIES_OPTIONS = [
+    dict(label="Top 5", value=5),
+    dict(label="Top 10", value=10),
+    dict(label="Top 25", value=25),
+    dict(label="Top 50", value=50),
+]
+BOX_ATTRIBUTE_OPTIONS = [
+    dict(label="Deaths per 1M population", value='Deaths/1M pop'),
+    dict(label="Tests per 1M population", value='Tests/1Mpop')
+]
 
-def load_display_data(data, total_cases, total_deaths, total_recoveries, fig, init_continent_fig, init_k_countries_plot, init_box_fig, init_dount_fig, gh):
-    # Initialize the Dash app
-    app = dash.Dash(__name__)
 
+def create_layout(snapshot):
+    """
+    This function builds the page layout from a snapshot (see dataset.Snapshot).
+
+    The graphs are empty, every one of them is drawn by its callback once the page is rendered.
+    """
+    data = snapshot.data
+    total_cases, total_deaths, total_recoveries = snapshot.totals
 
-    app.layout = html.Div(
+    return html.Div(
         style={'backgroundColor': theme['background_page'], 'color': theme['text'], 'padding': '20px'}, id="container",
         children=[
+            # What the clientside callbacks draw from (see helpers.client_data)
+            dcc.Store(id="client_data", data=snapshot.client_data),
+            # The input of the callbacks of the graphs without a dropdown
+            dcc.Store(id="snapshot_version", data=snapshot.version),
+
             # Title
             html.Div(
                 children=[
@@ -105,10 +142,7 @@ def load_display_data(data, total_cases, total_deaths, total_recoveries, fig, in
                         children=[
                             html.Br(),
                             
-                            dcc.Graph(
-                                id='totalcases_by_totaldeath_for_each_country',
-                                figure=fig
-                            ),
+                            dcc.Graph(id='totalcases_by_totaldeath_for_each_country'),
                             html.H5("TotalCases and TotalDeath By Country", style={"text-align": "center", "fontFamily": theme["font_family_header"], "color": theme["text"]}),
                         ]
                     ),
@@ -134,7 +168,7 @@ def load_display_data(data, total_cases, total_deaths, total_recoveries, fig, in
                                     value="New",
                                     style={ "color": theme["text"], 'margin-bottom':'10px'}
                                 ),
-                                dcc.Graph(id="continent_corona_bar", figure=init_continent_fig),
+                                dcc.Graph(id="continent_corona_bar"),
                                 html.H5("Corona Cases/Recovered/Deaths by Continent", style={"text-align": "center", "fontFamily": theme["font_family_header"], "color": theme["text"]}),
                             ], style={ 'padding': theme['card_padding'], 'borderRadius': theme['card_border']['radius'], 'margin': theme['card_margin']}),
                             width={"size": 6},  
@@ -145,37 +179,19 @@ def load_display_data(data, total_cases, total_deaths, total_recoveries, fig, in
                                 html.Div(children=[    
                                     dcc.Dropdown(
                                         id="select_attribute",
-                                        options=[
-                                            dict(label="Total Cases", value='TotalCases'),
-                                            dict(label="New Cases", value='NewCases'),
-                                            dict(label="Total Cases per 1M population", value='Tot\xa0Cases/1M pop'),
-                                            dict(label="Active Cases", value='ActiveCases'),
-                                            dict(label="Serious, Critical Cases", value='Serious,Critical'),
-                                            dict(label="Total Deaths", value='TotalDeaths'),
-                                            dict(label="New Deaths", value='NewDeaths'),
-                                            dict(label="Deaths per 1M population", value='Deaths/1M pop'),
-                                            dict(label="Total Recovered", value='TotalRecovered'),
-                                            dict(label="New Recovered", value='NewRecovered'),
-                                            dict(label="Total Tests", value='TotalTests'),
-                                            dict(label="Tests per 1M population", value='Tests/1Mpop')
-                                        ],
+                                        options=ATTRIBUTE_OPTIONS,
                                         multi=False,
                                         value="TotalCases",
                                         style={"width": "100%", 'display': 'inline-block',"color": theme["text"]}
                                     ),
                                     dcc.Dropdown(id="select_k_countries",
-                                        options=[
-                                            dict(label="Top 5", value=5),
-                                            dict(label="Top 10", value=10),
-                                            dict(label="Top 25", value=25),
-                                            dict(label="Top 50", value=50),
-                                        ],
+                                        options=K_COUNTRIES_OPTIONS,
                                         multi=False,
                                         value=10,
                                         style={"width": "100%", 'display': 'inline-block', "color": theme["text"]}
                                     ),
                                 ], style={'display': 'flex'}),
-                                dcc.Graph(id="k_countries_sorted", figure=init_k_countries_plot),
+                                dcc.Graph(id="k_countries_sorted"),
                                 html.H5("Visualize Countries by attribute.", style={"text-align": "center", "fontFamily": theme["font_family_header"], "color": theme["text"]}),
                             ], style={ 'padding': theme['card_padding'], 'borderRadius': theme['card_border']['radius'], 'margin': theme['card_margin']}),
                             width={ "size": 6},  
@@ -193,15 +209,12 @@ def load_display_data(data, total_cases, total_deaths, total_recoveries, fig, in
                             html.Div([
                                 dcc.Dropdown(
                                     id="select_box_attribute",
-                                    options=[
-                                        dict(label="Deaths per 1M population", value='Deaths/1M pop'),
-                                        dict(label="Tests per 1M population", value='Tests/1Mpop')
-                                    ],
+                                    options=BOX_ATTRIBUTE_OPTIONS,
                                     multi=False,
                                     value="Deaths/1M pop",
                                     style={"color": theme["text"], 'margin-bottom':'10px'}
                                 ),
-                                dcc.Graph(id="continent_box_plot", figure=init_box_fig),
+                                dcc.Graph(id="continent_box_plot"),
                                 html.H5("BoxPlot to explain the distribution of the variables", style={"text-align": "center", "fontFamily": theme["font_family_header"], "color": theme["text"]}),
                             ], 
                             style={'padding': theme['card_padding'], 'borderRadius': theme['card_border']['radius'], 'margin': theme['card_margin']}),
@@ -217,7 +230,7 @@ def load_display_data(data, total_cases, total_deaths, total_recoveries, fig, in
                                     clearable=False,
                                     style={"color": theme["text"], 'margin-bottom':'10px'}
                                 ),
-                                dcc.Graph(id="covid_donut_graph", figure=init_dount_fig),
+                                dcc.Graph(id="covid_donut_graph"),
                                 html.H5("COVID-19 Distribution by Country", style={"text-align": "center", "fontFamily": theme["font_family_header"], "color": theme["text"]}),
                             ], 
                             style={ 'padding': theme['card_padding'], 'borderRadius': theme['card_border']['radius'], 'margin': theme['card_margin']}),
@@ -230,7 +243,7 @@ def load_display_data(data, total_cases, total_deaths, total_recoveries, fig, in
             
 
             html.Div([
-                dcc.Graph(id="gh", figure=gh),
+                dcc.Graph(id="gh"),
                 html.H5("COVID-19 Impact Analysis: Total Cases vs. Mortality Rate per Million, Highlighted by Population and Testing Capacity", style={"text-align": "center", "fontFamily": theme["font_family_header"], "color": theme["text"]}),
                 ], 
                 style={ 'padding': theme['card_padding'], 'borderRadius': theme['card_border']['radius'], 'margin': theme['card_margin']}
@@ -243,15 +256,123 @@ def load_display_data(data, total_cases, total_deaths, total_recoveries, fig, in
     )
 
 
+def validation_layout():
+    """
+    This function returns the components of the callbacks, without any data.
+
+    Dash checks the callbacks against it instead of calling create_layout (it would wait for the first snapshot
+    when the app is created) and embedding the whole page a second time in every page load.
+    """
+    return html.Div([
+        dcc.Store(id="client_data"),
+        dcc.Store(id="snapshot_version"),
+        dcc.Dropdown(id="select_keyword"),
+        dcc.Dropdown(id="select_attribute"),
+        dcc.Dropdown(id="select_k_countries"),
+        dcc.Dropdown(id="select_box_attribute"),
+        dcc.Dropdown(id="country-dropdown"),
+        *(dcc.Graph(id=graph) for graph in ["totalcases_by_totaldeath_for_each_country", "continent_corona_bar",
+                                            "k_countries_sorted", "continent_box_plot", "covid_donut_graph", "gh"]),
+    ])
+
+
+def is_stale_figure(key, delta):
+    """This function tells if a cached callback figure (see load_display_data) is affected by a delta."""
+    name, *inputs = key
+    if name == "totalcases_by_totaldeath_for_each_country":
+        return is_affected(delta, ["TotalCases", "TotalDeaths", "Population", "Continent"])
+    if name == "gh":
+        return is_affected(delta, ["TotalCases", "Deaths/1M pop", "Population", "TotalTests"])
+    if name == "k_countries_sorted":
+        return is_affected(delta, [inputs[0]])
+    if name == "continent_box_plot":
+        return is_affected(delta, [inputs[0], "Continent"])
+    return True
+
+
+def load_display_data(store, figure_cache=None, metrics=None, prepare_responses=True):
+    """
+    This function creates the Dash app.
+
+    Parameters:
+        store : DataRefresher
+            Any object with a `current` snapshot, read on every page load and callback
+            so a refreshed snapshot is picked up without restarting the server.
+            The requests are answered 503 while it is None. The numbers of its `metrics` dict, when it has one
+            (the refreshes of a DataRefresher), are served on /metrics as dash_refresh_<name>.
+        figure_cache : FigureCache, Default=None
+            The cache of the callback figures, a new one is created when not given.
+        metrics : CallbackMetrics, Default=None
+            Records the cost of every callback, served on /metrics. A new one is created when not given.
+        prepare_responses : Boolean, Default=True
+            Answer the callback requests of every option of the dropdowns with responses serialized and compressed
+            once per snapshot (see figure_cache.PreparedResponses), instead of running the callbacks.
+    """
+    # Initialize the Dash app
+    app = dash.Dash(__name__)
+    figure_cache = figure_cache if figure_cache is not None else FigureCache(is_stale=is_stale_figure)
+
+    app.validation_layout = validation_layout()
+    app.layout = lambda: create_layout(store.current)
+
+    # A serving worker started before the publisher has nothing to serve yet (see shared_snapshot.SharedSnapshotStore).
+    # Runs before the Dash setup of the first request (any path, /metrics too), which builds the layout once and only once
+    def warming_up():
+        if store.current is None:
+            return "The dashboard is warming up, no data was published yet.", 503, {"Retry-After": "5"}
+
+    app.server.before_request_funcs.setdefault(None, []).insert(0, warming_up)
 
     # Defining the application callbacks
+    # The New/Total toggle and the donut only read a few numbers already in the page (the client_data store),
+    # they are drawn in the browser by assets/dashboard.js without a request to the server
 
-    @app.callback(
+    app.clientside_callback(
+        ClientsideFunction(namespace="dashboard", function_name="continent_bar"),
         Output("continent_corona_bar", "figure"),
-        Input("select_keyword", "value")
+        Input("select_keyword", "value"),
+        State("client_data", "data")
     )
-    def update_continent_corona_bar(value):
-        return plot_continent_data(data, keyword=value)
+
+    app.clientside_callback(
+        ClientsideFunction(namespace="dashboard", function_name="donut"),
+        Output('covid_donut_graph', 'figure'),
+        Input('country-dropdown', 'value'),
+        State("client_data", "data")
+    )
+
+    def k_countries_figure(snapshot, attribute, n_countries):
+        return figure_cache.get_or_build(("k_countries_sorted", attribute, n_countries), snapshot.version,
+                                         lambda: plot_top_k_countries(snapshot.dataset, n_countries, attribute),
+                                         snapshot.delta)
+
+    def box_plot_figure(snapshot, value):
+        return figure_cache.get_or_build(("continent_box_plot", value), snapshot.version,
+                                         lambda: plot_boxplots(snapshot.dataset, keyword=value),
+                                         snapshot.delta)
+
+    def scatter_figure(snapshot):
+        return figure_cache.get_or_build(("totalcases_by_totaldeath_for_each_country",), snapshot.version,
+                                         lambda: plot_scatter(snapshot.data), snapshot.delta)
+
+    def impact_figure(snapshot):
+        return figure_cache.get_or_build(("gh",), snapshot.version, lambda: idk(snapshot.data), snapshot.delta)
+
+    # The graphs without a dropdown are drawn once the page is rendered, from the snapshot currently served
+    @app.callback(
+        Output("totalcases_by_totaldeath_for_each_country", "figure"),
+        Input("snapshot_version", "data")
+    )
+    def update_cases_deaths_scatter(version):
+        return scatter_figure(store.current)
+
+
+    @app.callback(
+        Output("gh", "figure"),
+        Input("snapshot_version", "data")
+    )
+    def update_impact_scatter(version):
+        return impact_figure(store.current)
 
 
     @app.callback(
@@ -260,7 +381,7 @@ def load_display_data(data, total_cases, total_deaths, total_recoveries, fig, in
         Input("select_k_countries", "value")
     )
     def update_k_countries_sorted(attribute, n_countries):
-        return plot_top_k_countries(data, n_countries, attribute)
+        return k_countries_figure(store.current, attribute, n_countries)
 
 
     @app.callback(
@@ -268,27 +389,42 @@ def load_display_data(data, total_cases, total_deaths, total_recoveries, fig, in
         Input("select_box_attribute", "value")
     )
     def update_continent_box_plot(value):
-        return plot_boxplots(data, keyword=value)
+        return box_plot_figure(store.current, value)
 
+    # The figures of every option of the dropdowns (and of the graphs without one), their responses are prepared
+    # once per snapshot
+    def known_figures(snapshot):
+        for attribute in ATTRIBUTE_OPTIONS:
+            for n_countries in K_COUNTRIES_OPTIONS:
+                yield ("k_countries_sorted.figure", (attribute["value"], n_countries["value"]),
+                       k_countries_figure(snapshot, attribute["value"], n_countries["value"]))
+        for attribute in BOX_ATTRIBUTE_OPTIONS:
+            yield "continent_box_plot.figure", (attribute["value"],), box_plot_figure(snapshot, attribute["value"])
+        yield "totalcases_by_totaldeath_for_each_country.figure", (snapshot.version,), scatter_figure(snapshot)
+        yield "gh.figure", (snapshot.version,), impact_figure(snapshot)
+
+    metrics = metrics if metrics is not None else CallbackMetrics()
+    prepared = PreparedResponses(known_figures)
+    if prepare_responses:
+        prepared.install(app, store, metrics)
+
+    # Brotli (then gzip) for everything else, the Dash compress option only enables gzip
+    app.server.config["COMPRESS_ALGORITHM"] = ["br", "gzip"]
+    Compress(app.server)
+
+    metrics.gauges.update({
+        "dash_figure_cache_hits": lambda: figure_cache.hits,
+        "dash_figure_cache_misses": lambda: figure_cache.misses,
+        "dash_figure_cache_entries": lambda: len(figure_cache),
+        "dash_snapshot_version": lambda: store.current.version,
+        "dash_prepared_response_hits": lambda: prepared.hits,
+        "dash_prepared_responses": lambda: len(prepared),
+        "dash_prepared_responses_seconds": lambda: prepared.prepare_seconds,
+    })
+    refresh_metrics = getattr(store, "metrics", None)
+    if isinstance(refresh_metrics, dict):
+        metrics.gauges.update({f"dash_refresh_{name}": (lambda name=name: refresh_metrics[name])
+                               for name in refresh_metrics})
+    metrics.install(app)
 
-    @app.callback(
-        Output('covid_donut_graph', 'figure'),
-        [Input('country-dropdown', 'value')]
-    )
-    def update_donut_graph(value):
-        fig = go.Figure(go.Pie(
-            labels=['Active Cases', 'Recovered', 'Deaths'],
-            values=[data.loc[value, 'ActiveCasesPercent'],
-                    data.loc[value, 'RecoveredPercent'],
-                    data.loc[value, 'DeathsPercent']],
-            hole=0.3
-        ))
-
-        fig.update_layout(
-            title=f"COVID-19 Distribution for {value}",
-            # height=500,
-            # width=700
-        )
-        return fig
-        
     return app
@@ -0,0 +1,277 @@
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from corona_stats.schema import COLUMN_DTYPES
+from dataset import CoronaDataset, Snapshot
+from helpers import client_data, create_clean_dataframe
+
+
+logger = logging.getLogger(__name__)
+
+
+def scrape_in_process(skip_unchanged=False, last_content_hash=None):
+    """
+    This function runs the scrapy crawl on the scraping service of this process and returns its result
+    (see scrap.get_scraped_data). The reactor is started on the first call and reused by the next ones.
+    """
+    from scrap import get_scraped_data
+
+    return get_scraped_data(skip_unchanged=skip_unchanged, last_content_hash=last_content_hash)
+
+
+def scrape_in_subprocess(skip_unchanged=False, last_content_hash=None):
+    """
+    This function runs the scrapy crawl in a fresh child process and returns its result (see scrap.get_scraped_data).
+
+    The crawl is isolated from the dashboard process (memory, crashes), at the cost of starting a process per refresh.
+    """
+    from scrap import get_scraped_data
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(get_scraped_data, skip_unchanged=skip_unchanged,
+                               last_content_hash=last_content_hash).result()
+
+
+def crawl_histories_in_process():
+    """
+    This function crawls the page of every country on the scraping service of this process, the pipeline writes
+    their daily history (see scrap.get_country_histories). It returns the stats of the crawl.
+    """
+    from scrap import get_country_histories
+
+    return get_country_histories()
+
+
+def build_snapshot(total_stats, countries_data, version, previous=None):
+    """
+    This function builds the cleaned dataset and its aggregates from a scrape result.
+
+    Given the previous snapshot, only the rows that changed are applied to its dataset and
+    only the aggregates depending on them are recomputed.
+
+    Parameters:
+        total_stats : dict
+            The headline counters yielded by the spider ("TotalCase", "TotalDeaths", "TotalRecovered").
+        countries_data : dict object or dataframe
+            The countries data yielded by the spider.
+        version : int
+            The version of the new snapshot.
+        previous : Snapshot, Default=None
+            The snapshot currently served.
+    Returns:
+        snapshot : Snapshot
+            The snapshot ready to be served.
+    """
+    data = create_clean_dataframe(countries_data)
+    if previous is None:
+        dataset, delta = CoronaDataset(data), None
+    else:
+        dataset, delta = previous.dataset.updated(data, previous.version)
+    totals = (total_stats["TotalCase"], total_stats["TotalDeaths"], total_stats["TotalRecovered"])
+    return Snapshot(version, time.time(), dataset.data, dataset, totals, delta, total_stats.get("content_hash"),
+                    client_data(dataset))
+
+
+def save_snapshot(snapshot, directory):
+    """
+    This function persists the dataset and the totals of a snapshot as the last-good snapshot.
+
+    The dataset is written as Parquet (needs pyarrow) next to a small json file holding the totals.
+    Both files are written to temporary names first, then renamed, so a crash never leaves a half-written snapshot.
+    """
+    os.makedirs(directory, exist_ok=True)
+    data_path = os.path.join(directory, "countries.parquet")
+    meta_path = os.path.join(directory, "snapshot.json")
+
+    snapshot.data[list(COLUMN_DTYPES)].to_parquet(data_path + ".tmp")
+    with open(meta_path + ".tmp", "w") as file:
+        json.dump({"version": snapshot.version, "created_at": snapshot.created_at, "totals": snapshot.totals,
+                   "content_hash": snapshot.content_hash}, file)
+    os.replace(data_path + ".tmp", data_path)
+    os.replace(meta_path + ".tmp", meta_path)
+
+
+def load_snapshot(directory):
+    """
+    This function loads the last-good snapshot saved by save_snapshot.
+
+    Returns:
+        snapshot : Snapshot or None
+            The snapshot with its aggregates rebuilt, None when there is no usable snapshot on disk.
+    """
+    data_path = os.path.join(directory, "countries.parquet")
+    meta_path = os.path.join(directory, "snapshot.json")
+    if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+        return None
+    try:
+        with open(meta_path) as file:
+            meta = json.load(file)
+        total_stats = dict(zip(["TotalCase", "TotalDeaths", "TotalRecovered"], meta["totals"]))
+        total_stats["content_hash"] = meta.get("content_hash")
+        snapshot = build_snapshot(total_stats, pd.read_parquet(data_path), meta["version"])
+    except Exception:
+        logger.exception("The snapshot saved in %s can not be loaded", directory)
+        return None
+    return snapshot._replace(created_at=meta["created_at"])
+
+
+class DataRefresher:
+    """
+    This class keeps the snapshot served by the dashboard up to date.
+
+    A background thread re-scrapes every `interval` seconds, builds the new snapshot off the request path
+    and swaps it in with a single assignment, so readers of `current` always get a complete snapshot.
+    When `snapshot_dir` is given, every new snapshot is saved there and `load` can start from it.
+    When `publish_dir` is given, every snapshot served is also published there for the serving workers
+    (see shared_snapshot.publish_snapshot).
+    The rows of every scrape are appended to the history by the crawl itself (see corona_stats.pipelines).
+    When `crawl_histories` is given (e.g. crawl_histories_in_process), every refresh that changed the data
+    also crawls the country pages in another thread, their daily history is written by the same pipeline.
+    The scrapes run in this process by default (scrape_in_process), pass scrape=scrape_in_subprocess to isolate them.
+    """
+
+    def __init__(self, interval=3600, scrape=scrape_in_process, snapshot_dir=None, publish_dir=None,
+                 crawl_histories=None):
+        self.interval = interval
+        self.scrape = scrape
+        self.crawl_histories = crawl_histories
+        self.snapshot_dir = snapshot_dir
+        self.publish_dir = publish_dir
+        self._snapshot = None
+        # changed_rows is the number of rows applied by the last refresh (every row when it was a full rebuild).
+        # not_modified and same_content count the scrapes skipped because the page did not change (answered
+        # 304 Not Modified, or same content hash), skipped_cpu_seconds estimates the parse and build CPU they saved
+        # from the cost of the last parsed scrape.
+        self.metrics = {"refreshes": 0, "failed_refreshes": 0, "full_rebuilds": 0, "not_modified": 0,
+                        "same_content": 0, "skipped_cpu_seconds": 0.0, "changed_rows": 0, "changed_rows_total": 0}
+        self._last_scrape_cpu = 0.0
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._histories_thread = None
+
+    @property
+    def current(self):
+        """The snapshot currently served."""
+        return self._snapshot
+
+    def load(self):
+        """
+        This function serves the last-good snapshot saved on disk, if any.
+
+        Returns:
+            snapshot : Snapshot or None
+                The loaded snapshot, None when there is nothing to load.
+        """
+        if self.snapshot_dir is None:
+            return None
+        snapshot = load_snapshot(self.snapshot_dir)
+        if snapshot is not None:
+            self._snapshot = snapshot
+            logger.info("Snapshot %d loaded from %s", snapshot.version, self.snapshot_dir)
+            self._publish(snapshot)
+        return snapshot
+
+    def _publish(self, snapshot):
+        if self.publish_dir is None:
+            return
+        from shared_snapshot import publish_snapshot
+
+        try:
+            publish_snapshot(snapshot, self.publish_dir)
+        except Exception:
+            logger.exception("Publishing the snapshot to %s failed", self.publish_dir)
+
+    def refresh(self):
+        """
+        This function scrapes, builds a new snapshot and swaps it in.
+
+        Returns:
+            snapshot : Snapshot or None
+                The new snapshot, None when the scrape failed (the previous snapshot is kept).
+        """
+        with self._refresh_lock:
+            try:
+                previous = self._snapshot
+                # Without a snapshot to keep serving, an unchanged page must still be parsed
+                total_stats, countries_data = self.scrape(
+                    skip_unchanged=previous is not None,
+                    last_content_hash=previous.content_hash if previous is not None else None,
+                )
+                if countries_data is None:
+                    self.metrics[total_stats["unchanged"]] += 1
+                    self.metrics["skipped_cpu_seconds"] += self._last_scrape_cpu
+                    self.metrics["changed_rows"] = 0
+                    logger.info("The page did not change (%s), keeping snapshot %d", total_stats["unchanged"], previous.version)
+                    return previous
+                version = previous.version + 1 if previous else 1
+                started = time.thread_time()
+                snapshot = build_snapshot(total_stats, countries_data, version, previous)
+                self._last_scrape_cpu = total_stats.get("parse_cpu", 0.0) + time.thread_time() - started
+            except Exception:
+                self.metrics["failed_refreshes"] += 1
+                logger.exception("Refreshing the data failed, keeping the current snapshot")
+                return None
+            self._snapshot = snapshot
+
+            changed_rows = len(snapshot.data) if snapshot.delta is None else len(snapshot.delta.countries)
+            self.metrics["refreshes"] += 1
+            self.metrics["full_rebuilds"] += snapshot.delta is None
+            self.metrics["changed_rows"] = changed_rows
+            self.metrics["changed_rows_total"] += changed_rows
+            logger.info("Snapshot %d ready (%d countries, %d changed)", snapshot.version, len(snapshot.data), changed_rows)
+            if self.snapshot_dir is not None:
+                try:
+                    save_snapshot(snapshot, self.snapshot_dir)
+                except Exception:
+                    logger.exception("Saving the snapshot to %s failed", self.snapshot_dir)
+            self._publish(snapshot)
+            self._start_histories_crawl()
+            return snapshot
+
+    def _start_histories_crawl(self):
+        # A single crawl at a time, a refresh happening while the previous crawl runs does not start another one
+        if self.crawl_histories is None or (self._histories_thread is not None and self._histories_thread.is_alive()):
+            return
+        self._histories_thread = threading.Thread(target=self._crawl_histories, name="country-histories", daemon=True)
+        self._histories_thread.start()
+
+    def _crawl_histories(self):
+        try:
+            stats = self.crawl_histories()
+        except Exception:
+            logger.exception("Crawling the country histories failed")
+            return
+        logger.info("Country histories crawled (%d pages, %d days written)",
+                    stats.get("country_pages/count", 0), stats.get("history/days_written", 0))
+
+    def start(self, refresh_now=False):
+        """
+        This function starts the background refresh thread.
+
+        Parameters:
+            refresh_now : Boolean, Default=False
+                Revalidate right away instead of waiting for the first interval (used after a cold start from disk).
+        """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, args=(refresh_now,), name="data-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """This function asks the background thread to stop after the running refresh."""
+        self._stop.set()
+
+    def _run(self, refresh_now):
+        if refresh_now:
+            self.refresh()
+        while not self._stop.wait(self.interval):
+            self.refresh()
@@ -1,34 +1,171 @@
-from scrapy.crawler import CrawlerProcess
+import os
+import threading
+from concurrent.futures import Future
+
+import pandas as pd
+from itemadapter import ItemAdapter
+from scrapy.crawler import CrawlerRunner
 from scrapy import signals
-from scrapy.signalmanager import dispatcher
-from corona_stats.spiders.coronaspider import CoronaSpiderSpider
-from corona_stats.spiders.totalStatscoronapider import TotalstatscoronapiderSpider
-
-
-# Global variable to store scraped data
-scraped_data = []
-
-# Handler function to process scraped data
-def item_scraped(item, response, spider):
-    scraped_data.append(item)
-
-# Function to initialize and run the scrapy process with multiple spiders
-def run_all_spiders(spider_classes):
-    process = CrawlerProcess()
-    
-    # Connect the item_scraped function to the item_scraped signal
-    dispatcher.connect(item_scraped, signal=signals.item_scraped)
-    
-    # Loop through the provided spider classes and add them to the crawl process
-    for spider_class in spider_classes:
-        process.crawl(spider_class)
-        
-    # Start the crawling process
-    process.start()  # Automatically stops after all spiders have finished
+from scrapy.utils.project import get_project_settings
+from scrapy.utils.reactor import install_reactor
+from corona_stats.schema import FIELD_TO_COLUMN, INDEX_FIELD
+from corona_stats.spiders.coronapagespider import CoronaPageSpider
+from corona_stats.spiders.countryhistoryspider import CountryHistorySpider
+
+
+# The project settings (corona_stats/settings.py) are found wherever the process is started from
+os.environ.setdefault("SCRAPY_SETTINGS_MODULE", "corona_stats.settings")
+
+
+class ScrapingService:
+    """
+    This class runs the crawls on a twisted reactor started once, in a background thread.
+
+    The reactor can not be restarted, so instead of a CrawlerProcess per scrape (which blocks the caller
+    and can only run once per process) every crawl is scheduled with a CrawlerRunner on the same running reactor
+    (the one set in the TWISTED_REACTOR setting). The process can then crawl again and again.
+    Each call of crawl returns a concurrent.futures.Future holding the items of that crawl only
+    (use asyncio.wrap_future to await it from a coroutine).
+    The Scrapy stats of the last crawl of every spider are kept in `stats`, keyed by the spider name.
+    """
+
+    def __init__(self, settings=None):
+        self.settings = settings if settings is not None else get_project_settings()
+        self.stats = {}
+        self._reactor = None
+        self._runner = None
+        self._thread = None
+        self._started = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """This function starts the reactor thread, if it is not running yet, and waits until it runs."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run_reactor, name="scrapy-reactor", daemon=True)
+                self._thread.start()
+        self._started.wait()
+
+    def _run_reactor(self):
+        install_reactor(self.settings["TWISTED_REACTOR"], self.settings.get("ASYNCIO_EVENT_LOOP"))
+        from twisted.internet import reactor
+
+        self._reactor = reactor
+        self._runner = CrawlerRunner(self.settings)
+        reactor.callWhenRunning(self._started.set)
+        # Signals can only be handled by the main thread
+        reactor.run(installSignalHandlers=False)
+
+    def crawl(self, spider_class, on_item=None, **spider_kwargs):
+        """
+        This function schedules a crawl and returns without waiting for it.
+
+        Parameters:
+            spider_class : scrapy.Spider subclass
+                The spider to run.
+            on_item : callable, Default=None
+                Called with every item as soon as it is scraped (from the reactor thread, it must not block).
+                The items are then streamed to it instead of being kept until the end of the crawl.
+            **spider_kwargs :
+                The spider arguments (e.g. parser_mode="columnar").
+        Returns:
+            items : concurrent.futures.Future
+                Resolves to the list of the items scraped, in the order they were scraped (empty with on_item).
+                It holds the exception of the first spider callback that raised, if any: Scrapy only logs it
+                and completes the crawl.
+        """
+        self.start()
+        future = Future()
+        self._reactor.callFromThread(self._crawl, spider_class, spider_kwargs, future, on_item)
+        return future
+
+    def _crawl(self, spider_class, spider_kwargs, future, on_item):
+        items = []
+        errors = []
+
+        def item_scraped(item, response, spider):
+            if on_item is not None:
+                on_item(item)
+            else:
+                items.append(item)
+
+        def spider_error(failure, response, spider):
+            errors.append(failure)
+
+        def crawled(_):
+            self.stats[crawler.spidercls.name] = crawler.stats.get_stats()
+            if errors:
+                future.set_exception(errors[0].value)
+            else:
+                future.set_result(items)
+
+        try:
+            crawler = self._runner.create_crawler(spider_class)
+            # The receiver belongs to this crawler only, it is dropped with it
+            crawler.signals.connect(item_scraped, signal=signals.item_scraped, weak=False)
+            crawler.signals.connect(spider_error, signal=signals.spider_error, weak=False)
+            deferred = self._runner.crawl(crawler, **spider_kwargs)
+        except Exception as error:
+            future.set_exception(error)
+            return
+        deferred.addCallbacks(crawled, lambda failure: future.set_exception(failure.value))
+
+    def stop(self):
+        """This function stops the running crawls and the reactor, the service can not be started again."""
+        if self._reactor is not None:
+            self._reactor.callFromThread(self._reactor.stop)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service():
+    """This function returns the scraping service of the process, created on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = ScrapingService()
+        return _service
+
 
 # Function to run spiders and return scraped data
-def get_scraped_data():
-    # List of spider classes to run
-    spiders_to_run = [CoronaSpiderSpider, TotalstatscoronapiderSpider]
-    run_all_spiders(spiders_to_run)
-    return scraped_data
+def run_all_spiders(spider_classes, **spider_kwargs):
+    # The spiders run concurrently, the items are returned spider by spider
+    futures = [get_service().crawl(spider_class, **spider_kwargs) for spider_class in spider_classes]
+    return [item for future in futures for item in future.result()]
+
+# When skip_unchanged is set and the page did not change since the last scrape, the countries data is None
+# and the totals are {"unchanged": reason, "content_hash": ...} (see CoronaPageSpider)
+def get_scraped_data(parser_mode="items", skip_unchanged=False, last_content_hash=None):
+    # A single spider downloads the page once and yields the countries data first, then the totals
+    spiders_to_run = [CoronaPageSpider]
+    scraped_data = run_all_spiders(spiders_to_run, parser_mode=parser_mode, skip_unchanged=skip_unchanged,
+                                   last_content_hash=last_content_hash)
+    if scraped_data and "unchanged" in scraped_data[0]:
+        return scraped_data[0], None
+    # The totals are the last item, the crawl is incomplete without them
+    if not scraped_data or not isinstance(scraped_data[-1], dict) or "TotalCase" not in scraped_data[-1]:
+        raise ValueError(f"The scrape of the page did not yield the headline counters "
+                         f"({len(scraped_data)} items scraped)")
+    *countries_data, total_stats = scraped_data
+    if parser_mode == "items":
+        return total_stats, countries_frame(countries_data)
+    # The columnar parser yields the typed dataframe wrapped in a dict
+    countries_data = countries_data[0]
+    return total_stats, countries_data.get("countries_frame", countries_data)
+
+
+# The CoronaStatsItem of the countries as a dataframe: countries as index, schema column names
+def countries_frame(items):
+    data = pd.DataFrame.from_records([ItemAdapter(item).asdict() for item in items], index=INDEX_FIELD)
+    data.index.name = None
+    return data.rename(columns=FIELD_TO_COLUMN)
+
+
+# Crawls the daily history of every country (see CountryHistorySpider), the items are written by the pipeline
+# and streamed to on_item, they are not kept. Returns the stats of the crawl.
+def get_country_histories(limit=None, on_item=None):
+    service = get_service()
+    service.crawl(CountryHistorySpider, on_item=on_item or (lambda item: None), limit=limit).result()
+    return service.stats[CountryHistorySpider.name]
@@ -0,0 +1,148 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+from corona_stats.schema import COLUMN_DTYPES, INDEX_FIELD
+from dataset import CoronaDataset, Snapshot
+from helpers import client_data
+
+
+# Where the snapshots are published for the gunicorn workers (see wsgi.py), e.g. under /dev/shm
+SHARED_SNAPSHOT_DIR = os.environ.get("SHARED_SNAPSHOT_DIR",
+                                     os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "shared"))
+# The file pointing to the snapshot currently published, rewritten (renamed over) on every publish
+POINTER_FILE = "current.json"
+# The published snapshots kept on disk: a worker may still open the previous one right after a publish
+KEEP_SNAPSHOTS = 2
+
+logger = logging.getLogger(__name__)
+
+
+def publish_snapshot(snapshot, directory, keep=KEEP_SNAPSHOTS):
+    """
+    This function publishes the dataset of a snapshot for the serving workers, as an Arrow IPC file (needs pyarrow).
+
+    The file is not compressed and the numeric columns are written without validity bitmaps (missing values stay NaN),
+    so the workers can memory-map it and use the columns in place: the pages are shared by every worker through
+    the page cache instead of being copied in each of them.
+    The dataset is written under a versioned name, then the pointer file (version, totals...) is renamed over the old one,
+    the workers never see a half-written snapshot. Every publish gets its own id in the pointer file: a publisher
+    restarted without its snapshots starts again from version 1, the workers still see its snapshots as new.
+
+    Parameters:
+        snapshot : Snapshot
+            The snapshot to publish.
+        directory : str
+            The directory shared with the workers (see SharedSnapshotStore).
+        keep : int, Default=KEEP_SNAPSHOTS
+            The number of published snapshots kept, the older files are removed.
+    """
+    import pyarrow as pa
+
+    os.makedirs(directory, exist_ok=True)
+    data = snapshot.data
+    columns = {INDEX_FIELD: pa.array(data.index.astype(str))}
+    for column, dtype in COLUMN_DTYPES.items():
+        values = data[column] if dtype == "category" else data[column].to_numpy()
+        columns[column] = pa.array(values, from_pandas=dtype == "category")
+    table = pa.table(columns)
+
+    name = f"snapshot-{snapshot.version}.arrow"
+    path = os.path.join(directory, name)
+    with pa.OSFile(path + ".tmp", "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(path + ".tmp", path)
+
+    pointer_path = os.path.join(directory, POINTER_FILE)
+    with open(pointer_path + ".tmp", "w") as file:
+        json.dump({"publish_id": uuid.uuid4().hex, "version": snapshot.version, "file": name, "created_at": snapshot.created_at,
+                   "totals": snapshot.totals, "content_hash": snapshot.content_hash}, file)
+    os.replace(pointer_path + ".tmp", pointer_path)
+
+    published = sorted(glob.glob(os.path.join(directory, "snapshot-*.arrow")), key=os.path.getmtime)
+    for old_path in published[:-keep]:
+        os.remove(old_path)
+
+
+def read_published_data(path):
+    """
+    This function memory-maps a dataset published by publish_snapshot.
+
+    The numeric columns are read-only views of the mapped file, only the index and "Continent" are copied.
+
+    Returns:
+        data : dataframe
+            The cleaned dataset, with the dtypes of corona_stats.schema.
+    """
+    import pyarrow as pa
+
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    # One block per column (split_blocks), pandas would copy them to consolidate the blocks
+    data = pd.DataFrame({column: table.column(column).to_pandas(split_blocks=True) for column in COLUMN_DTYPES},
+                        copy=False)
+    data.index = pd.Index(table.column(INDEX_FIELD).to_pandas(), dtype=str)
+    return data
+
+
+class SharedSnapshotStore:
+    """
+    This class serves the snapshots published in a directory (see publish_snapshot) to the app of a serving worker.
+
+    It has the `current` snapshot of a DataRefresher, so load_display_data takes it as its store, but it never scrapes:
+    a single publisher process crawls and publishes, every worker attaches to what it published.
+    The pointer file is checked at most every `poll_interval` seconds, from the requests. A new publish
+    is mapped and its aggregates are built by the first request that sees it, the others keep
+    the previous one in the meantime.
+    Nothing blocks: `current` is None until the first snapshot is published (load_display_data answers 503 meanwhile),
+    so the app can be created in the gunicorn master before the publisher starts.
+    """
+
+    def __init__(self, directory, poll_interval=5.0):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self._snapshot = None
+        self._publish_id = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def current(self):
+        """The last snapshot published, None when nothing is published yet."""
+        # Until a snapshot is attached the pointer file is checked on every read
+        if (self._snapshot is None or time.monotonic() - self._checked_at >= self.poll_interval) \
+                and self._lock.acquire(blocking=False):
+            try:
+                self._attach()
+            finally:
+                self._lock.release()
+        return self._snapshot
+
+    def _attach(self):
+        self._checked_at = time.monotonic()
+        try:
+            with open(os.path.join(self.directory, POINTER_FILE)) as file:
+                meta = json.load(file)
+        except FileNotFoundError:
+            return
+        if meta["publish_id"] == self._publish_id:
+            return
+        version = meta["version"]
+        if self._snapshot is not None and version <= self._snapshot.version:
+            # A restarted publisher: the figure caches are keyed by version, the versions served must keep growing
+            version = self._snapshot.version + 1
+        try:
+            data = read_published_data(os.path.join(self.directory, meta["file"]))
+            dataset = CoronaDataset(data)
+            self._snapshot = Snapshot(version, meta["created_at"], data, dataset, tuple(meta["totals"]), None,
+                                      meta["content_hash"], client_data(dataset))
+        except Exception:
+            logger.exception("The snapshot %d published in %s can not be attached", meta["version"], self.directory)
+            return
+        self._publish_id = meta["publish_id"]
+        logger.info("Snapshot %d attached from %s (served as version %d)", meta["version"], self.directory, version)
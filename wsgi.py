@@ -0,0 +1,15 @@
+"""
+The production entry point of the dashboard, served by gunicorn (see gunicorn.conf.py):
+
+    gunicorn -c gunicorn.conf.py wsgi:server
+
+The workers never scrape: `python app.py publish` (started by gunicorn.conf.py) crawls and publishes every snapshot
+in SHARED_SNAPSHOT_DIR, each worker memory-maps the last one published (see shared_snapshot.SharedSnapshotStore).
+Only the serving side is imported: not app.py nor the refresher, and the scraper (scrapy, twisted) never.
+"""
+from layout import load_display_data
+from shared_snapshot import SHARED_SNAPSHOT_DIR, SharedSnapshotStore
+
+
+app = load_display_data(SharedSnapshotStore(SHARED_SNAPSHOT_DIR))
+server = app.server